@@ -0,0 +1,86 @@
+#Save and restore times of each network as more networks are built in the same process, as in main.py.
+#Run it on two commits and compare the results to see how checkpoint i/o scales with the other models.
+import numpy as np
+import argparse
+import tempfile
+import json
+import os
+from benchmarks.suite import measure, result, commit
+
+def get_graph(network): #networks built into the default graph have no graph of their own
+    import tensorflow as tf
+    return getattr(network, 'graph', tf.get_default_graph())
+
+def checkpoint_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.startswith('checkpoint-0'))
+
+def build(name, path, attributes_num, classes_num):
+    from networks import Lstm, StackedAutoEncoder, ForwardClassifier
+    weights_path = os.path.join(path, name)
+    os.makedirs(weights_path, exist_ok=True)
+    if name.endswith('lstm'):
+        return Lstm(max_sequence_length=5, input_size=attributes_num + classes_num, state_size=50, output_size=classes_num, loss_function='sparse-softmax-cross-entropy',
+                    scope_name=name, weights_path=weights_path, log_path=weights_path)
+    if name.endswith('sdae'):
+        return StackedAutoEncoder(input_size=attributes_num + classes_num, dims=[150, 100, 50], encoding_functions=['tanh', 'tanh', 'relu'], decoding_functions=['sigmoid'] * 3,
+                                noise=['mask-0.5'] * 3, epoch=[1] * 3, loss_functions=['rmse'] * 3, optimization_function='adam', scope_name=name,
+                                weights_path=weights_path, log_path=weights_path)
+    return ForwardClassifier(input_size=attributes_num + classes_num, output_size=classes_num, dims=[80, 20], activation_functions=['relu', 'relu'],
+                            output_activation_function='softmax', loss_function='rmse', optimization_function='adam', scope_name=name,
+                            weights_path=weights_path, log_path=weights_path)
+
+def run(attributes_num=200, classes_num=5, repeats=5, output=None):
+    import tensorflow as tf
+    from utils import Utils as utils
+    names = ['lstm', 'sdae', 'forward', 'sdae-forward', 'sdae-lstm'] #the stages of main.py
+    report = {'commit': commit(), 'scale': {'attributes_num': attributes_num, 'classes_num': classes_num}, 'networks': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for i, name in enumerate(names):
+            network = build(name, directory, attributes_num, classes_num)
+            graph = get_graph(network)
+            with graph.as_default():
+                initializer = getattr(network, 'initializer', None) or tf.global_variables_initializer()
+            with utils.get_session(graph) as sess:
+                sess.run(initializer)
+                checkpoint_path = os.path.join(network.weights_path, 'checkpoint')
+                save = measure(lambda: network.saver.save(sess, checkpoint_path, global_step=0), repeats)
+                restore = measure(lambda: network.saver.restore(sess, checkpoint_path + '-0'), repeats)
+            variables = graph.get_collection(tf.GraphKeys.GLOBAL_VARIABLES)
+            report['networks'][name] = {'built_before': i, 'graph_variables': len(variables),
+                                        'graph_parameters': int(sum(np.prod(v.get_shape().as_list()) for v in variables)),
+                                        'checkpoint_bytes': checkpoint_size(network.weights_path),
+                                        'save': result(save, 1), 'restore': result(restore, 1)}
+            print("{0}: {1} variables in the graph, checkpoint of {2} bytes, save = {3:.4f}s, restore = {4:.4f}s".format(
+                name, len(variables), report['networks'][name]['checkpoint_bytes'], save, restore))
+
+    if output is None:
+        output = 'benchmarks/results/checkpoints-{0}.json'.format(report['commit'])
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results saved in {0}".format(output))
+    return report
+
+def compare(baseline_path, current_path): #ratios above 1 are speedups
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    with open(current_path, 'r') as f:
+        current = json.load(f)
+    for name, measurement in current['networks'].items():
+        if name in baseline['networks']:
+            for operation in ['save', 'restore']:
+                ratio = baseline['networks'][name][operation]['seconds'] / max(measurement[operation]['seconds'], 1e-12)
+                print("{0} {1}: {2:.4f}s -> {3:.4f}s ({4:.2f}x)".format(name, operation, baseline['networks'][name][operation]['seconds'], measurement[operation]['seconds'], ratio))
+
+if __name__ == '__main__': #python -m benchmarks.checkpoints [--compare baseline.json current.json]
+    parser = argparse.ArgumentParser(description="Checkpoint save and restore times of the networks.")
+    parser.add_argument('--attributes', type=int, default=200)
+    parser.add_argument('--classes', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), default=None)
+    args = parser.parse_args()
+    if args.compare is not None:
+        compare(*args.compare)
+    else:
+        run(args.attributes, args.classes, args.repeats, args.output)
@@ -0,0 +1,44 @@
+import numpy as np
+import time
+from utils import Utils as utils
+
+#Per-row implementation used before add_noise was vectorized, kept as reference
+def per_row_add_noise(x, noise):
+    shape = x.shape
+    x = np.reshape(x, (-1, shape[-1]))
+    result = []
+    if noise == 'none':
+        result = x
+    elif noise == 'gaussian':
+        n = np.random.normal(0, 0.1, (len(x), len(x[0])))
+        result = x + n
+    elif 'mask' in noise:
+        frac = float(noise.split('-')[1])
+        temp = np.copy(x)
+        for i in temp:
+            n = np.random.choice(len(i), int(round(frac * len(i))), replace=False)
+            i[n] = 0
+        result = temp
+    result = np.reshape(result, shape)
+    return result
+
+def throughput(function, repeats):
+    start = time.perf_counter()
+    for i in range(repeats):
+        function()
+    return repeats / (time.perf_counter() - start)
+
+def run(shapes=[(128, 200), (32, 5, 200), (100000, 200)], noises=['mask-0.5', 'gaussian'], repeats=20):
+    for shape in shapes:
+        x = np.random.rand(*shape).astype(np.float32)
+        buffer = np.empty_like(x)
+        samples = int(np.prod(shape[:-1]))
+        for noise in noises:
+            reference = throughput(lambda: per_row_add_noise(x, noise), repeats) * samples
+            vectorized = throughput(lambda: utils.add_noise(x, noise), repeats) * samples
+            buffered = throughput(lambda: utils.add_noise(x, noise, out=buffer), repeats) * samples
+            print("{0} {1}: per-row = {2:.0f} rows/s, vectorized = {3:.0f} rows/s ({4:.1f}x), buffered = {5:.0f} rows/s ({6:.1f}x)".format(
+                shape, noise, reference, vectorized, vectorized / reference, buffered, buffered / reference))
+
+if __name__ == '__main__':
+    run()
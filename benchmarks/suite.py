@@ -0,0 +1,132 @@
+import numpy as np
+import subprocess
+import argparse
+import platform
+import tempfile
+import json
+import time
+import os
+from benchmarks import synthetic
+import dataset
+import loader
+
+def measure(function, repeats=3): #best of the repeats, the least disturbed by other processes
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def result(seconds, samples):
+    return {'seconds': seconds, 'samples': int(samples), 'samples_per_second': samples / seconds if seconds > 0 else float('inf')}
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def loader_benchmarks(source, destination, records, repeats):
+    return {'convert': result(measure(lambda: loader.convert(source, destination), repeats), records)}
+
+def utils_benchmarks(path, repeats):
+    from utils import Utils as utils
+    values = np.concatenate((np.load(path + '/e_records.npy'), np.load(path + '/e_classes.npy')), axis=2)
+    classes = np.load(path + '/e_classes.npy')
+    flat_values = np.reshape(values, (-1, values.shape[2]))
+    flat_classes = np.reshape(classes, (-1, classes.shape[2]))
+    rnn_values, rnn_classes, lengths = utils.rnn_shift_padding(values, classes, 5)
+
+    benchmarks = {
+        'rnn_shift_indexes': (lambda: dataset.rnn_shift_indexes(classes, 5), len(classes)),
+        'rnn_shift_padding': (lambda: utils.rnn_shift_padding(values, classes, 5), len(values)),
+        'homogenize': (lambda: utils.homogenize(flat_values, flat_classes, 0.3), len(flat_values)),
+        'add_noise_gaussian': (lambda: utils.add_noise(flat_values, 'gaussian'), len(flat_values)),
+        'add_noise_mask': (lambda: utils.add_noise(flat_values, 'mask-0.5'), len(flat_values)),
+        'get_cost_mask': (lambda: utils.get_cost_mask(classes), len(classes)),
+        'generate_classifier_train_test': (lambda: utils.generate_classifier_train_test(flat_values, flat_classes, 0.8), len(flat_values)),
+        'get_rnn_bucketed_batches': (lambda: utils.get_rnn_bucketed_batches(lengths, 32), len(lengths)),
+        'generate_rnn_folds': (lambda: utils.generate_rnn_folds(rnn_values, rnn_classes, lengths, 5, stratified=True), len(rnn_values))
+    }
+    return {name: result(measure(function, repeats), samples) for name, (function, samples) in benchmarks.items()}
+
+def network_benchmarks(path, weights_path, epochs=1):
+    from networks import Lstm, StackedAutoEncoder, ForwardClassifier
+    from utils import Utils as utils
+    values = np.concatenate((np.load(path + '/e_records.npy'), np.load(path + '/e_classes.npy')), axis=2)
+    classes = np.load(path + '/e_classes.npy')
+    flat_values = np.reshape(values, (-1, values.shape[2]))
+    flat_classes = np.reshape(classes, (-1, classes.shape[2]))
+    rnn_values, rnn_classes, lengths = utils.rnn_shift_padding(values, classes, 5)
+    results = {}
+
+    os.makedirs(weights_path + '/lstm', exist_ok=True)
+    lstm = Lstm(max_sequence_length=5, input_size=values.shape[2], state_size=50, output_size=classes.shape[2], loss_function='sparse-softmax-cross-entropy',
+                batch_size=32, epoch=epochs, noise='gaussian', scope_name='benchmark-lstm', weights_path=weights_path + '/lstm', log_path=weights_path + '/lstm')
+    results['lstm_train'] = result(measure(lambda: lstm.train(rnn_values, rnn_classes, lengths), 1), len(rnn_values) * epochs)
+    results['lstm_predict'] = result(measure(lambda: lstm.predict(rnn_values, lengths), 1), len(rnn_values))
+
+    os.makedirs(weights_path + '/sdae', exist_ok=True)
+    sdae = StackedAutoEncoder(input_size=flat_values.shape[1], dims=[100], encoding_functions=['relu'], decoding_functions=['sigmoid'], noise=['mask-0.5'],
+                            epoch=[epochs], loss_functions=['rmse'], optimization_function='gradient-descent', batch_size=128, scope_name='benchmark-sdae',
+                            weights_path=weights_path + '/sdae', log_path=weights_path + '/sdae')
+    results['sdae_train'] = result(measure(lambda: sdae.train(flat_values), 1), len(flat_values) * epochs)
+    results['sdae_encode'] = result(measure(lambda: sdae.encode(flat_values), 1), len(flat_values))
+
+    os.makedirs(weights_path + '/forward', exist_ok=True)
+    classifier = ForwardClassifier(input_size=flat_values.shape[1], output_size=flat_classes.shape[1], dims=[80,20], activation_functions=['relu','relu'],
+                                output_activation_function='softmax', loss_function='rmse', optimization_function='adam', epoch=epochs, batch_size=128,
+                                scope_name='benchmark-forward', weights_path=weights_path + '/forward', log_path=weights_path + '/forward')
+    results['forward_train'] = result(measure(lambda: classifier.train(flat_values, flat_classes), 1), (len(flat_values) // 128) * 128 * epochs)
+    results['forward_predict'] = result(measure(lambda: classifier.predict(flat_values), 1), len(flat_values))
+    return results
+
+def run(e_records=2000, t_records=2000, attributes_num=200, classes_num=5, repeats=3, epochs=1, networks=True, output=None, seed=0, missing_fraction=0.1):
+    np.random.seed(seed)
+    report = {'commit': commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'numpy': np.__version__,
+              'cpus': os.cpu_count(), 'scale': {'e_records': e_records, 't_records': t_records, 'attributes_num': attributes_num,
+              'classes_num': classes_num, 'epochs': epochs, 'missing_fraction': missing_fraction}}
+    with tempfile.TemporaryDirectory() as directory:
+        source = directory + '/harmonized.json'
+        synthetic.generate(source, e_records, t_records, attributes_num=attributes_num, classes_num=classes_num, missing_fraction=missing_fraction, seed=seed)
+        report['loader'] = loader_benchmarks(source, directory, e_records + t_records, repeats)
+        report['utils'] = utils_benchmarks(directory, repeats)
+        if networks:
+            report['networks'] = network_benchmarks(directory, directory + '/weights', epochs)
+
+    if output is None:
+        output = 'benchmarks/results/{0}.json'.format(report['commit'])
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results saved in {0}".format(output))
+    return report
+
+def compare(baseline_path, current_path): #ratios above 1 are speedups
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    with open(current_path, 'r') as f:
+        current = json.load(f)
+    for group in ['loader', 'utils', 'networks']:
+        for name, measurement in sorted(current.get(group, {}).items()):
+            if name in baseline.get(group, {}):
+                ratio = measurement['samples_per_second'] / baseline[group][name]['samples_per_second']
+                print("{0}.{1}: {2:.0f} samples/s ({3:.2f}x)".format(group, name, measurement['samples_per_second'], ratio))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time conversion, preprocessing and networks on synthetic data.')
+    parser.add_argument('--e-records', type=int, default=2000)
+    parser.add_argument('--t-records', type=int, default=2000)
+    parser.add_argument('--attributes', type=int, default=200)
+    parser.add_argument('--classes', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--missing', type=float, default=0.1, help='fraction of the waves without a class')
+    parser.add_argument('--skip-networks', action='store_true')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help='previous results file to compare with')
+    args = parser.parse_args()
+    report = run(args.e_records, args.t_records, args.attributes, args.classes, args.repeats, args.epochs, not args.skip_networks, args.output, missing_fraction=args.missing)
+    if args.compare is not None:
+        compare(args.compare, args.output or 'benchmarks/results/{0}.json'.format(report['commit']))
@@ -0,0 +1,28 @@
+import numpy as np
+import json
+
+#Writes a file with the harmonized.json schema read by loader.convert
+def generate(path, e_records=1000, t_records=1000, waves_num=[6,2], attributes_num=200, classes_num=5, invalid_fraction=0.05, missing_fraction=0.1, seed=0):
+    random = np.random.RandomState(seed)
+    with open(path, 'w') as f:
+        f.write('{"records": [')
+        first = True
+        for prefix, records, waves in [('e', e_records, waves_num[0]), ('t', t_records, waves_num[1])]:
+            for i in range(records):
+                if random.rand() < invalid_fraction: #records with missing waves are skipped by the loader
+                    waves_count = random.randint(1, waves + 2)
+                else:
+                    waves_count = waves
+                values = np.round(random.rand(waves_count, attributes_num), 4)
+                classes = np.eye(classes_num, dtype=int)[random.randint(classes_num, size=waves_count)]
+                classes[random.rand(waves_count) < missing_fraction] = 0 #waves without a class, as in the real data
+                record = {'id': '{0}{1}'.format(prefix, i), 'waves': [{'values': values[w].tolist(),
+                          'class': {'one-hot': classes[w].tolist()}} for w in range(waves_count)]}
+                if not first:
+                    f.write(', ')
+                json.dump(record, f)
+                first = False
+        f.write(']}')
+
+if __name__ == '__main__':
+    generate('data/harmonized.json')
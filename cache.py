@@ -0,0 +1,130 @@
+import numpy as np
+import hashlib
+import shutil
+import json
+import os
+
+def fingerprint(value, digest):
+    if isinstance(value, np.ndarray) and value.ndim == 0:
+        value = value.item()
+    if isinstance(value, np.ndarray) or hasattr(value, 'chunks'): #arrays and lazy datasets are hashed by content
+        digest.update('array:{0}:{1}'.format(np.dtype(value.dtype).str, tuple(value.shape)).encode())
+        chunks = value.chunks() if hasattr(value, 'chunks') else (value[start:start+65536] for start in range(0, max(len(value), 1), 65536))
+        for chunk in chunks:
+            digest.update(np.ascontiguousarray(chunk).data)
+    elif isinstance(value, (list, tuple)):
+        digest.update('sequence:{0}'.format(len(value)).encode())
+        for v in value:
+            fingerprint(v, digest)
+    elif isinstance(value, dict):
+        digest.update('dict:{0}'.format(len(value)).encode())
+        for k in sorted(value):
+            fingerprint(k, digest)
+            fingerprint(value[k], digest)
+    elif value is None or isinstance(value, (bool, int, float, str, np.number)):
+        digest.update('scalar:{0!r}'.format(value).encode())
+    else:
+        raise BaseException("Cannot fingerprint {0}.".format(type(value)))
+
+def fingerprint_path(path, digest):
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            fingerprint_path(os.path.join(path, name), digest)
+    else:
+        digest.update('file:{0}'.format(os.path.basename(path)).encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+
+def fingerprint_code(code, digest): #the bytecode, its constants and the names it refers to, nested functions included
+    digest.update(code.co_code)
+    digest.update('names:{0!r}'.format(code.co_names).encode())
+    for constant in code.co_consts:
+        if hasattr(constant, 'co_code'):
+            fingerprint_code(constant, digest)
+        else:
+            digest.update('constant:{0!r}'.format(constant).encode())
+
+class Cache:
+
+    def __init__(self, path='./cache', max_size=10 * 2**30):
+        assert max_size > 0, "Cache size should be positive"
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, function, args, kwargs, seed=None, dependencies=[]):
+        digest = hashlib.blake2b(digest_size=20)
+        code = getattr(function, '__func__', function).__code__
+        digest.update('{0}.{1}'.format(function.__module__, function.__qualname__).encode())
+        fingerprint_code(code, digest) #changing the function invalidates its entries
+        fingerprint(list(args), digest)
+        fingerprint(kwargs, digest)
+        fingerprint(seed, digest)
+        for path in dependencies:
+            fingerprint_path(path, digest)
+        return digest.hexdigest()
+
+    def get_or_compute(self, function, *args, seed=None, dependencies=[], **kwargs):
+        key = self.key(function, args, kwargs, seed, dependencies)
+        entry = os.path.join(self.path, key)
+        if os.path.exists(os.path.join(entry, 'entry.json')):
+            os.utime(entry) #most recently used
+            return self._load(entry)
+
+        state = np.random.get_state() #hits and misses leave the caller's random state alike
+        if seed is not None:
+            np.random.seed(seed)
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            np.random.set_state(state)
+        self._store(entry, result)
+        self._evict(keep=entry)
+        return self._load(entry)
+
+    def _store(self, entry, result):
+        multiple = isinstance(result, (list, tuple))
+        arrays = list(result) if multiple else [result]
+        temporary = entry + '.tmp-{0}'.format(os.getpid())
+        os.makedirs(temporary, exist_ok=True)
+        for i, array in enumerate(arrays):
+            output = np.lib.format.open_memmap(os.path.join(temporary, '{0}.npy'.format(i)), mode='w+', dtype=array.dtype, shape=tuple(array.shape))
+            for start in range(0, len(array), 65536):
+                output[start:start+65536] = array[start:start+65536]
+            output.flush()
+            del output
+        with open(os.path.join(temporary, 'entry.json'), 'w') as f:
+            json.dump({'multiple': multiple, 'arrays': len(arrays)}, f)
+        if os.path.exists(entry): #written meanwhile by another process
+            shutil.rmtree(temporary)
+        else:
+            os.rename(temporary, entry)
+
+    def _load(self, entry):
+        with open(os.path.join(entry, 'entry.json'), 'r') as f:
+            description = json.load(f)
+        arrays = [np.load(os.path.join(entry, '{0}.npy'.format(i)), mmap_mode='r') for i in range(description['arrays'])]
+        return tuple(arrays) if description['multiple'] else arrays[0]
+
+    def size(self, entry):
+        return sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+
+    def _evict(self, keep=None):
+        times, sizes = {}, {}
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if '.tmp-' in name:
+                continue
+            try:
+                times[entry], sizes[entry] = os.path.getmtime(entry), self.size(entry)
+            except FileNotFoundError: #evicted meanwhile by another process
+                continue
+        entries = sorted(times, key=times.get) #least recently used first
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            if entry != keep:
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= sizes[entry]
@@ -0,0 +1,106 @@
+import numpy as np
+import threading
+import json
+import time
+import os
+
+def get_random_state():
+    name, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+    return [name, keys.tolist(), int(position), int(has_gauss), float(cached_gaussian)]
+
+def set_random_state(state):
+    name, keys, position, has_gauss, cached_gaussian = state
+    np.random.set_state((name, np.array(keys, dtype=np.uint32), position, has_gauss, cached_gaussian))
+
+def resume(state, controller): #returns the epoch and the batch to restart from
+    if state is None or 'epoch' not in state:
+        return 0, 0
+    controller.__dict__.update(state['controller'])
+    set_random_state(state['random_state']) #the batches of the epoch are drawn again from the same state
+    return state['epoch'], state['position']
+
+#Periodic checkpoints of a variable list written by a background thread.
+#The values are copied out of the session, so training continues while they are saved.
+class Checkpointer:
+
+    def __init__(self, path, variables, every_steps=0, every_minutes=0, keep=3):
+        assert keep > 0, "At least one checkpoint should be kept"
+        self.path = path
+        self.variables = list(variables)
+        self.every_steps = every_steps
+        self.every_seconds = every_minutes * 60
+        self.keep = keep
+        self.steps = 0
+        self.last_step = 0
+        self.last_time = time.time()
+        self.writer = None
+        self.error = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def due(self):
+        if self.every_steps > 0 and self.steps - self.last_step >= self.every_steps:
+            return True
+        return self.every_seconds > 0 and time.time() - self.last_time >= self.every_seconds
+
+    def step(self, sess, get_state): #called after every training step, the state is built only when saving
+        self.steps += 1
+        if self.due():
+            self.save(sess, get_state())
+
+    def save(self, sess, state):
+        values = sess.run(self.variables) #the only part done on the training thread
+        state = json.loads(json.dumps(dict(state, step=self.steps))) #copied before training changes it
+        self.wait() #at most one checkpoint in flight
+        self.last_step = self.steps
+        self.last_time = time.time()
+        self.writer = threading.Thread(target=self._write, args=(self.steps, values, state), daemon=True)
+        self.writer.start()
+
+    def _write(self, step, values, state):
+        try:
+            name = os.path.join(self.path, 'checkpoint-{0}'.format(step))
+            with open(name + '.tmp.npz', 'wb') as f:
+                np.savez(f, **{'{0}'.format(i): value for i, value in enumerate(values)})
+            os.replace(name + '.tmp.npz', name + '.npz')
+            with open(name + '.tmp.json', 'w') as f:
+                json.dump(state, f)
+            os.replace(name + '.tmp.json', name + '.json') #the state is written last, it marks a complete checkpoint
+            for old in self.checkpoints()[:-self.keep]:
+                os.remove(old + '.json')
+                os.remove(old + '.npz')
+        except BaseException as e:
+            self.error = e
+
+    def wait(self):
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def checkpoints(self): #complete checkpoints, oldest first
+        steps = [int(name[len('checkpoint-'):-len('.json')]) for name in os.listdir(self.path)
+                 if name.startswith('checkpoint-') and name.endswith('.json') and '.tmp' not in name]
+        return [os.path.join(self.path, 'checkpoint-{0}'.format(step)) for step in sorted(steps)]
+
+    def restore(self, sess): #returns the saved state, None when there is nothing to resume
+        checkpoints = self.checkpoints()
+        if len(checkpoints) == 0:
+            return None
+        with open(checkpoints[-1] + '.json', 'r') as f:
+            state = json.load(f)
+        with np.load(checkpoints[-1] + '.npz') as values:
+            for i, variable in enumerate(self.variables):
+                variable.load(values['{0}'.format(i)], sess)
+        self.steps = self.last_step = state['step']
+        return state
+
+    def clear(self): #a new training run does not resume from older checkpoints
+        self.wait()
+        for checkpoint in self.checkpoints():
+            os.remove(checkpoint + '.json')
+            os.remove(checkpoint + '.npz')
+
+    def close(self):
+        self.wait()
@@ -0,0 +1,182 @@
+#Command line entry point, every command imports only the modules it needs so that the light ones start quickly
+import argparse
+import json
+import os
+
+required = {'evaluate': ['model'], 'score': ['model', 'source', 'destination'], 'serve': ['model'], 'update': ['model', 'source', 'destination'],
+            'quantize': ['model']}
+
+trainings = {'train': ['lstm', 'sdae', 'forward', 'sdae-forward', 'sdae-lstm'], 'train-lstm': ['lstm'], 'train-sdae': ['sdae'],
+             'train-classifier': ['forward'], 'train-sdae-classifier': ['sdae-forward'], 'train-sdae-lstm': ['sdae-lstm']}
+
+def read_config(command, path=None): #configs/<command>.json unless another file is given
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configs', command + '.json')
+        if not os.path.exists(path):
+            return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def get_options(config, args): #command line arguments override the config file
+    options = dict(config)
+    options.update({name: value for name, value in vars(args).items() if value is not None and name not in ('command', 'config')})
+    return options
+
+def convert(options):
+    import loader
+    os.makedirs(options['destination'], exist_ok=True)
+    loader.convert(options['source'], options['destination'], options['waves_num'], compact=options['compact'], pack_classes=options['pack_classes'])
+
+def train(command, options):
+    import main
+    main.make_folders()
+    workers = options.pop('workers', None)
+    return main.train(trainings[command], options, workers)
+
+def sweep(command, options):
+    import main
+    main.make_folders()
+    workers = options.pop('workers', None)
+    name = options.pop('network')
+    return main.run_sweep(name, options, workers) if command == 'sweep' else main.run_folds(name, options, workers)
+
+def evaluate(options):
+    import numpy as np
+    import runtime
+    import dataset
+    from evaluation import ConfusionMatrix
+    data = dataset.Dataset(options['data_path'], options['prefix'])
+    model = runtime.load(options['model'])
+    encoder = runtime.load(options['encoder']) if options.get('encoder') is not None else None
+    confusion = ConfusionMatrix(model.output_size)
+    if model.config['kind'] == 'lstm': #next wave of the shifted sequences, as Lstm.test
+        X, Y, lengths = dataset.rnn_shift_padding(data.values, data.classes, model.config['max_sequence_length'])
+        for start in range(0, len(X), model.chunk_size):
+            x, y, length = X[start:start+model.chunk_size], Y[start:start+model.chunk_size], lengths[start:start+model.chunk_size]
+            output = model.predict(encoder.timeseries_predict(x) if encoder is not None else x, length)
+            confusion.update_scores(y, output, mask=np.arange(y.shape[1]) < length[:, None])
+    elif model.config['kind'] == 'forward':
+        for start in range(0, len(data.flat_values), model.chunk_size):
+            x, y = data.flat_values[start:start+model.chunk_size], data.flat_classes[start:start+model.chunk_size]
+            confusion.update_scores(y, model.predict(encoder.predict(x) if encoder is not None else x), mask=np.sum(y, axis=1) > 0) #missing waves have no class
+    else:
+        raise BaseException("Only classifiers can be evaluated.")
+    confusion.print()
+    metrics = confusion.metrics()
+    print("Test: accuracy = {0:.2f}%".format(metrics['accuracy'] * 100))
+    return metrics
+
+def score(command, options):
+    import scoring
+    scorer = scoring.Scorer(options['model'], options.get('encoder'))
+    if command == 'score':
+        scoring.score_file(scorer, options['source'], options['destination'], options.get('format'), options['chunk_size'])
+    else:
+        scoring.serve(scorer, options['host'], options['port'], options['max_batch'], options['max_wait_ms'] / 1000)
+
+def update(options): #new waves only, the states of the people are kept between runs
+    import scoring
+    import incremental
+    scorer = incremental.IncrementalScorer(options['model'], options.get('encoder'), options['state_path'], options['capacity'])
+    try:
+        scoring.score_file(scorer, options['source'], options['destination'], options.get('format'), options['chunk_size'])
+    finally:
+        scorer.close()
+
+def quantize(options):
+    import runtime
+    import quantization
+    runtime.quantize(options['model'], quantization.quantized_path(options['model']))
+    print("Saved", quantization.quantized_path(options['model']))
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="SDA-LSTM commands, defaults are read from configs/<command>.json")
+    commands = parser.add_subparsers(dest='command')
+
+    command = commands.add_parser('convert', help="harmonized.json to .npy files")
+    command.add_argument('--source', default=None)
+    command.add_argument('--destination', default=None)
+    command.add_argument('--compact', action='store_const', const=True, default=None, help="float16 values and uint8 classes")
+    command.add_argument('--pack-classes', action='store_const', const=True, default=None, help="bit-packed one-hot classes")
+
+    for name in trainings:
+        command = commands.add_parser(name, help="train " + ", ".join(trainings[name]))
+        command.add_argument('--resume', action='store_const', const=True, default=None, help="continue from the periodic checkpoints")
+        command.add_argument('--workers', type=int, default=None)
+
+    for name in ['sweep', 'folds']:
+        command = commands.add_parser(name, help="hyperparameter sweep" if name == 'sweep' else "k-fold cross-validation")
+        command.add_argument('network', choices=['lstm', 'sdae', 'forward'])
+        command.add_argument('--workers', type=int, default=None)
+    command = commands.choices['sweep']
+    command.add_argument('--search', choices=['grid', 'random'], default=None, help="every point of the grid or random samples of it")
+    command.add_argument('--trials', type=int, default=None, help="random samples")
+
+    command = commands.add_parser('evaluate', help="exported classifier on a dataset, without tensorflow for the feed-forward ones")
+    command.add_argument('--model', default=None)
+    command.add_argument('--encoder', default=None)
+    command.add_argument('--data-path', default=None)
+    command.add_argument('--prefix', default=None)
+
+    command = commands.add_parser('score', help="records to predictions with an exported model")
+    command.add_argument('source', nargs='?', default=None)
+    command.add_argument('destination', nargs='?', default=None)
+    command.add_argument('--model', default=None)
+    command.add_argument('--encoder', default=None)
+    command.add_argument('--format', choices=['json', 'jsonl'], default=None)
+    command.add_argument('--chunk-size', type=int, default=None)
+
+    command = commands.add_parser('serve', help="http scoring server")
+    command.add_argument('--model', default=None)
+    command.add_argument('--encoder', default=None)
+    command.add_argument('--host', default=None)
+    command.add_argument('--port', type=int, default=None)
+    command.add_argument('--max-batch', type=int, default=None)
+    command.add_argument('--max-wait-ms', type=float, default=None)
+
+    command = commands.add_parser('update', help="one lstm step per new wave, from the stored states of the people")
+    command.add_argument('source', nargs='?', default=None, help="records with the new waves only")
+    command.add_argument('destination', nargs='?', default=None)
+    command.add_argument('--model', default=None)
+    command.add_argument('--encoder', default=None)
+    command.add_argument('--state-path', default=None, help="sqlite file of the states")
+    command.add_argument('--capacity', type=int, default=None, help="states kept in memory")
+    command.add_argument('--format', choices=['json', 'jsonl'], default=None)
+    command.add_argument('--chunk-size', type=int, default=None)
+
+    command = commands.add_parser('quantize', help="int8 copy of an exported feed-forward model")
+    command.add_argument('--model', default=None)
+
+    for command in commands.choices.values():
+        command.add_argument('--config', default=None, help="config file, configs/<command>.json by default")
+    return parser
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return
+    options = get_options(read_config(args.command, args.config), args)
+    missing = [name for name in required.get(args.command, []) if options.get(name) is None]
+    if missing:
+        parser.error("{0} requires {1}".format(args.command, ", ".join(missing)))
+
+    if args.command == 'convert':
+        defaults = {'source': 'data/harmonized.json', 'destination': './data', 'waves_num': [6, 2], 'compact': False, 'pack_classes': False}
+        return convert(dict(defaults, **options))
+    if args.command in trainings:
+        return train(args.command, options)
+    if args.command in ('sweep', 'folds'):
+        return sweep(args.command, options)
+    if args.command == 'evaluate':
+        return evaluate(dict({'data_path': './data', 'prefix': 't'}, **options))
+    if args.command in ('score', 'serve'):
+        defaults = {'chunk_size': 4096, 'host': '127.0.0.1', 'port': 8080, 'max_batch': 1024, 'max_wait_ms': 5}
+        return score(args.command, dict(defaults, **options))
+    if args.command == 'update':
+        return update(dict({'state_path': './weights/lstm/states.sqlite', 'capacity': 65536, 'chunk_size': 4096}, **options))
+    return quantize(options)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import numpy as np
+import functools
+import os
+from runner import Stage
+import runner
+
+def run(objective, k, path='./weights/folds', workers=None):
+    stages = []
+    for fold in range(k):
+        weights_path = os.path.join(path, 'fold-{0}'.format(fold)) #folds never share checkpoints
+        os.makedirs(weights_path, exist_ok=True)
+        stages.append(Stage('fold-{0}'.format(fold), functools.partial(objective, fold, weights_path)))
+    results = runner.run(stages, workers)
+    return [results['fold-{0}'.format(fold)] for fold in range(k)]
+
+def summarize(results):
+    summary = {}
+    for metric in results[0]:
+        values = np.array([result[metric] for result in results], dtype=np.float64)
+        summary[metric] = (np.mean(values, axis=0), np.var(values, axis=0))
+    return summary
+
+def print_summary(summary):
+    for metric, (mean, variance) in sorted(summary.items()):
+        if np.ndim(mean) == 0:
+            print("{0}: mean = {1:.6f}, variance = {2:.6f}".format(metric, mean, variance))
+        else:
+            for i in range(len(mean)):
+                print("{0} {1}: mean = {2:.6f}, variance = {3:.6f}".format(metric, i+1, mean[i], variance[i]))
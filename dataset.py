@@ -0,0 +1,194 @@
+import numpy as np
+import json
+import abc
+import os
+
+class LazyArray(abc.ABC):
+    chunk_size = 65536
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @abc.abstractmethod
+    def _take(self, rows): #rows are an index array or a slice
+        pass
+
+    def __getitem__(self, index):
+        rest = ()
+        if isinstance(index, tuple):
+            index, rest = index[0], index[1:]
+        if isinstance(index, (int, np.integer)):
+            result = self._take(np.array([index % len(self)]))[0]
+            return result[rest] if rest else result
+        if not isinstance(index, slice):
+            index = np.asarray(index)
+            if index.dtype == bool:
+                index = np.where(index)[0]
+        result = self._take(index)
+        return result[(slice(None),) + rest] if rest else result
+
+    def __array__(self, dtype=None, copy=None):
+        result = self[:]
+        return result if dtype is None else result.astype(dtype)
+
+    def subset(self, indexes):
+        return IndexedArray(self, indexes)
+
+    def chunks(self):
+        for start in range(0, len(self), self.chunk_size):
+            yield self[start:start+self.chunk_size]
+
+    def sum(self, axis=None, dtype=None, out=None, **kwargs): #reductions over the rows are computed chunk by chunk
+        assert axis is None or 0 in np.atleast_1d(axis), "Only reductions over the first axis are supported"
+        return sum(np.sum(chunk, axis=axis, dtype=dtype) for chunk in self.chunks())
+
+class ConcatenatedArray(LazyArray): #arrays joined along the last axis, e.g. values and classes
+
+    def __init__(self, arrays, dtype=None):
+        assert all(len(a) == len(arrays[0]) for a in arrays), "Arrays should have the same length"
+        self.arrays = arrays
+        self.shape = arrays[0].shape[:-1] + (sum(a.shape[-1] for a in arrays),)
+        self.dtype = np.dtype(dtype) if dtype is not None else np.result_type(*[a.dtype for a in arrays]) #compact arrays are upcast per batch
+
+    def _take(self, rows):
+        return np.concatenate([np.asarray(a[rows], dtype=self.dtype) for a in self.arrays], axis=-1)
+
+class StackedArray(LazyArray): #arrays joined along the first axis, e.g. e_ and t_ records
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.offsets = np.cumsum([0] + [len(a) for a in arrays])
+        self.shape = (int(self.offsets[-1]),) + arrays[0].shape[1:]
+        self.dtype = np.result_type(*[a.dtype for a in arrays])
+
+    def _take(self, rows):
+        if isinstance(rows, slice):
+            rows = np.arange(*rows.indices(len(self)))
+        result = np.empty((len(rows),) + self.shape[1:], dtype=self.dtype)
+        parts = np.searchsorted(self.offsets, rows, side='right') - 1
+        for i in range(len(self.arrays)):
+            positions = np.where(parts == i)[0]
+            if len(positions) > 0:
+                result[positions] = self.arrays[i][rows[positions] - self.offsets[i]]
+        return result
+
+class IndexedArray(LazyArray): #subset of the rows of another array
+
+    def __init__(self, array, indexes):
+        indexes = np.asarray(indexes)
+        if indexes.dtype == bool:
+            indexes = np.where(indexes)[0]
+        self.array = array
+        self.indexes = indexes
+        self.shape = (len(indexes),) + array.shape[1:]
+        self.dtype = array.dtype
+
+    def _take(self, rows):
+        return np.asarray(self.array[self.indexes[rows]])
+
+    def subset(self, indexes):
+        return IndexedArray(self.array, self.indexes[indexes])
+
+class ShiftedArray(LazyArray): #rnn_shift_padding applied to the rows on access
+
+    def __init__(self, array, selection, start, length, max_sequence_length, shift=0):
+        self.array = array
+        self.selection = selection
+        self.start = start
+        self.length = length
+        self.max_sequence_length = max_sequence_length
+        self.shift = shift
+        self.shape = (len(selection), max_sequence_length) + array.shape[2:]
+        self.dtype = array.dtype
+
+    def _take(self, rows):
+        data = np.asarray(self.array[self.selection[rows]])
+        return rnn_shift_gather(data, np.arange(len(data)), self.start[rows], self.length[rows], self.max_sequence_length, self.shift)
+
+class UnpackedArray(LazyArray): #one-hot classes stored with np.packbits
+
+    def __init__(self, array, classes_num):
+        self.array = array
+        self.classes_num = classes_num
+        self.shape = array.shape[:-1] + (classes_num,)
+        self.dtype = np.dtype(np.uint8)
+
+    def _take(self, rows):
+        return np.unpackbits(np.asarray(self.array[rows]), axis=-1, count=self.classes_num)
+
+class Dataset:
+
+    def __init__(self, path='./data', prefix='e', mmap_mode='r', dtype=np.float32):
+        self.records = np.load(path + '/' + prefix + '_records.npy', mmap_mode=mmap_mode)
+        packed_path = path + '/' + prefix + '_classes.packed'
+        if os.path.exists(packed_path + '.npy'):
+            with open(packed_path + '.json', 'r') as f:
+                classes_num = json.load(f)['classes_num']
+            packed = np.load(packed_path + '.npy', mmap_mode=mmap_mode)
+            self.classes = UnpackedArray(packed, classes_num)
+            flat_classes = UnpackedArray(np.reshape(packed, (-1, packed.shape[2])), classes_num)
+        else:
+            self.classes = np.load(path + '/' + prefix + '_classes.npy', mmap_mode=mmap_mode)
+            flat_classes = np.reshape(self.classes, (-1, self.classes.shape[2]))
+        self.values = ConcatenatedArray([self.records, self.classes], dtype)
+
+        #one row per wave, reshaping the memory maps does not copy them
+        self.flat_records = np.reshape(self.records, (-1, self.records.shape[2]))
+        self.flat_classes = flat_classes
+        self.flat_values = ConcatenatedArray([self.flat_records, self.flat_classes], dtype)
+
+def concatenate(arrays):
+    if all(isinstance(a, np.ndarray) and not isinstance(a, np.memmap) for a in arrays):
+        return np.concatenate(arrays)
+    return StackedArray(arrays)
+
+def take(X, indexes): #lazy datasets and memory maps return a view, arrays in memory a copy
+    if isinstance(X, LazyArray):
+        return X.subset(indexes)
+    if isinstance(X, np.memmap):
+        return IndexedArray(X, indexes)
+    return X[indexes]
+
+def homogenize(X, Y, ratio_threshold=1, cache=None, seed=None):
+    from utils import Utils as utils
+    if cache is None:
+        indexes = utils.homogenize_indexes(Y, ratio_threshold, np.random.RandomState(seed) if seed is not None else np.random)
+    else:
+        indexes = cache.get_or_compute(utils.homogenize_indexes, Y, ratio_threshold, seed=seed)
+    return take(X, indexes), take(Y, indexes)
+
+def rnn_shift_indexes(X_, max_sequence_length):
+    assert len(X_) > 0, "Dataset should have at least one timeseries"
+    assert max_sequence_length > 0, "Max sequence length should be positive"
+    waves = X_.shape[1]
+    valid = np.max(X_, axis=2) > 0 #at least 1 valid class per wave
+    has_valid = np.any(valid, axis=1)
+    start = np.where(has_valid, np.argmax(valid, axis=1), 0)
+    end = np.where(has_valid, waves - 1 - np.argmax(valid[:, ::-1], axis=1), 0)
+    end = np.minimum(end, start + max_sequence_length) #truncate to the first max_sequence_length waves
+    length = end - start
+
+    selection = np.where(length > 0)[0]
+    return selection, start[selection], length[selection]
+
+def rnn_shift_gather(X, rows, start, length, max_sequence_length, shift=0):
+    waves = X.shape[1]
+    steps = np.arange(max_sequence_length)
+    waves_indexes = np.minimum(start[:, None] + steps + shift, waves - 1)
+    result = X[rows[:, None], waves_indexes]
+    result[steps >= length[:, None]] = 0
+    return result
+
+def rnn_shift_padding(X, X_, max_sequence_length, cache=None):
+    assert len(X) == len(X_), "Input and classes should have the same length"
+    if cache is None:
+        selection, start, length = rnn_shift_indexes(np.asarray(X_), max_sequence_length)
+    else:
+        selection, start, length = cache.get_or_compute(rnn_shift_indexes, X_, max_sequence_length)
+    newX = ShiftedArray(X, selection, start, length, max_sequence_length)
+    newX_ = ShiftedArray(X_, selection, start, length, max_sequence_length, shift=1) #classes shifted by one wave
+    return newX, newX_, length
@@ -0,0 +1,38 @@
+import numpy as np
+
+class ConfusionMatrix: #rows are labels, columns are predictions
+
+    def __init__(self, classes_num):
+        self.classes_num = classes_num
+        self.counts = np.zeros((classes_num, classes_num), dtype=np.int64)
+
+    def update(self, labels, predictions, mask=None):
+        labels, predictions = np.ravel(labels), np.ravel(predictions)
+        if mask is not None:
+            mask = np.ravel(mask)
+            labels, predictions = labels[mask], predictions[mask]
+        self.counts += np.bincount(labels * self.classes_num + predictions, minlength=self.classes_num ** 2).reshape(self.classes_num, self.classes_num)
+
+    def update_scores(self, Y, output, mask=None): #one-hot labels and scores, the class is on the last axis
+        self.update(np.argmax(Y, axis=-1), np.argmax(output, axis=-1), mask)
+
+    def accuracy(self):
+        return np.trace(self.counts) / max(np.sum(self.counts), 1)
+
+    def recall(self):
+        return np.diag(self.counts) / np.maximum(np.sum(self.counts, axis=1), 1)
+
+    def precision(self):
+        return np.diag(self.counts) / np.maximum(np.sum(self.counts, axis=0), 1)
+
+    def f1(self):
+        precision, recall = self.precision(), self.recall()
+        return np.where(precision + recall > 0, 2 * precision * recall / np.maximum(precision + recall, 1e-12), 0.)
+
+    def metrics(self):
+        return {'accuracy': self.accuracy(), 'class_accuracy': self.recall(), 'precision': self.precision(), 'recall': self.recall(), 'f1': self.f1()}
+
+    def print(self):
+        precision, recall, f1 = self.precision(), self.recall(), self.f1()
+        for i in range(self.classes_num):
+            print("class {0}, precision = {1:.2f}, recall = {2:.2f}, f1 = {3:.2f}, values =".format(i+1, precision[i], recall[i], f1[i]), self.counts[i].tolist())
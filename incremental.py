@@ -0,0 +1,189 @@
+#Stateful lstm inference, each new wave costs one step instead of a rerun of the whole history
+import numpy as np
+import sqlite3
+import runtime
+import scoring
+
+class StateStore: #cell and hidden states by person, the least recently used are spilled to an sqlite file
+
+    def __init__(self, state_size, output_size, path=None, capacity=65536, window=(0, 0)):
+        assert capacity > 0, "Capacity should be positive"
+        self.state_size = state_size
+        self.output_size = output_size
+        self.window = tuple(window) #the latest inputs, (waves, input size)
+        self.width = state_size + output_size + self.window[0] * self.window[1] #c, m and the window side by side
+        self.rows = {}
+        self.keys = [None] * capacity
+        self.states = np.zeros((capacity, self.width), dtype=np.float32)
+        self.waves = np.zeros(capacity, dtype=np.int64)
+        self.pending = np.zeros(capacity, dtype=np.int64) #latest waves in the window but not in c and m
+        self.used = np.zeros(capacity, dtype=np.int64) #tick of the last access
+        self.free = list(range(capacity - 1, -1, -1))
+        self.tick = 0
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS states (id TEXT PRIMARY KEY, waves INTEGER, pending INTEGER, state BLOB)")
+
+    def __len__(self):
+        if self.db is None:
+            return len(self.rows)
+        self.flush()
+        return self.db.execute("SELECT COUNT(*) FROM states").fetchone()[0]
+
+    def _grow(self):
+        capacity = len(self.states)
+        self.keys += [None] * capacity
+        self.states = np.concatenate([self.states, np.zeros_like(self.states)])
+        self.waves = np.concatenate([self.waves, np.zeros_like(self.waves)])
+        self.pending = np.concatenate([self.pending, np.zeros_like(self.pending)])
+        self.used = np.concatenate([self.used, np.zeros_like(self.used)])
+        self.free += list(range(2 * capacity - 1, capacity - 1, -1))
+
+    def _write(self, rows):
+        self.db.executemany("INSERT OR REPLACE INTO states VALUES (?, ?, ?, ?)",
+                            [(self.keys[row], int(self.waves[row]), int(self.pending[row]), self.states[row].tobytes()) for row in rows])
+
+    def _spill(self, count): #states in use by the current batch stay
+        resident = np.array(list(self.rows.values()), dtype=np.int64)
+        resident = resident[self.used[resident] < self.tick]
+        rows = resident[np.argsort(self.used[resident])[:count]] #least recently used first
+        self._write(rows)
+        for row in rows:
+            del self.rows[self.keys[row]]
+            self.keys[row] = None
+            self.free.append(int(row))
+        return len(rows)
+
+    def _read(self, keys):
+        found = {}
+        for start in range(0, len(keys), 500): #sqlite limits the number of parameters
+            part = keys[start:start+500]
+            query = "SELECT id, waves, pending, state FROM states WHERE id IN ({0})".format(','.join('?' * len(part)))
+            for key, waves, pending, state in self.db.execute(query, part):
+                found[key] = (waves, pending, np.frombuffer(state, dtype=np.float32))
+        return found
+
+    def get(self, keys): #rows of the states, new people start from zeros
+        self.tick += 1
+        present = [self.rows[key] for key in keys if key in self.rows]
+        self.used[present] = self.tick #never spilled while in use
+        missing = list(dict.fromkeys(key for key in keys if key not in self.rows))
+        while len(missing) > len(self.free):
+            if self.db is None or self._spill(len(missing) - len(self.free)) == 0:
+                self._grow()
+        found = self._read(missing) if self.db is not None and missing else {}
+        for key in missing:
+            row = self.free.pop()
+            self.rows[key] = row
+            self.keys[row] = key
+            self.waves[row], self.pending[row], self.states[row] = found.get(key, (0, 0, 0.))
+            self.used[row] = self.tick
+        return np.array([self.rows[key] for key in keys], dtype=np.int64)
+
+    def cell(self, rows):
+        return self.states[rows, :self.state_size], self.states[rows, self.state_size:self.state_size + self.output_size]
+
+    def history(self, rows): #oldest input first
+        return np.reshape(self.states[rows, self.state_size + self.output_size:], (len(rows),) + self.window)
+
+    def push(self, rows, x): #a new wave at the end of the window
+        if self.window[0] > 0:
+            history = self.history(rows)
+            full = self.waves[rows] >= self.window[0]
+            history[full] = np.roll(history[full], -1, axis=1)
+            history[np.arange(len(rows)), np.minimum(self.waves[rows], self.window[0] - 1)] = x
+            self.states[rows, self.state_size + self.output_size:] = np.reshape(history, (len(rows), self.window[0] * self.window[1]))
+        self.waves[rows] += 1
+
+    def put(self, rows, c, m):
+        self.states[rows, :self.state_size] = c
+        self.states[rows, self.state_size:self.state_size + self.output_size] = m
+        self.pending[rows] = 0
+
+    def flush(self): #every resident state to disk, e.g. before the process exits
+        if self.db is not None:
+            self._write(list(self.rows.values()))
+            self.db.commit()
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+#Same interface as scoring.Scorer, the records hold the new waves only, and the results match scoring.Scorer on the whole history:
+#waves before the first one with a class are skipped, waves without a class wait in the window until a wave with a class
+#follows, since the window of scoring.Scorer ends at the last class, and once a person has more than max_sequence_length waves
+#the latest ones are rerun from zeros, since training never unrolled more steps.
+class IncrementalScorer:
+
+    def __init__(self, model_path, encoder_path=None, state_path=None, capacity=65536):
+        self.model = runtime.load(model_path)
+        if self.model.config['kind'] != 'lstm':
+            raise BaseException("Only lstm models keep a state.")
+        self.encoder = runtime.load(encoder_path) if encoder_path is not None else None
+        self.max_sequence_length = self.model.config['max_sequence_length']
+        self.store = StateStore(self.model.state_size, self.model.output_size, state_path, capacity, (self.max_sequence_length, self.model.input_size))
+
+    def _step(self, rows): #the waiting waves and the new one, the window is rerun once it is full
+        c, m = self.store.cell(rows)
+        history = self.store.history(rows)
+        full = self.store.waves[rows] > self.max_sequence_length
+        count = self.store.pending[rows] + 1
+        first = self.store.waves[rows] - count
+        for t in range(int(np.max(count[~full], initial=0))):
+            active = ~full & (count > t)
+            c[active], m[active] = self.model.step(history[active, first[active] + t], c[active], m[active])
+        if np.any(full): #c and m of a full window are not stepped anymore, m keeps its latest output
+            m[full] = self.model.predict(history[full], np.full(np.sum(full), self.max_sequence_length))[:, -1]
+        self.store.put(rows, c, m)
+        return m
+
+    def update(self, keys, X, valid=None): #one wave per row, the waves of a person in chronological order, returns the outputs and the waves scored
+        X = np.asarray(X, dtype=np.float32)
+        if valid is None:
+            valid = np.ones(len(keys), dtype=bool)
+        if self.encoder is not None:
+            X = self.encoder.predict(X)
+        seen = {}
+        occurrence = np.empty(len(keys), dtype=np.int64) #the second wave of a person waits for the first
+        for i, key in enumerate(keys):
+            occurrence[i] = seen[key] = seen.get(key, -1) + 1
+        outputs = np.full((len(keys), self.model.output_size), np.nan, dtype=np.float32) #nan until the first wave with a class
+        waves = np.zeros(len(keys), dtype=np.int64)
+        for step in range(int(np.max(occurrence, initial=-1)) + 1):
+            positions = np.where(occurrence == step)[0]
+            rows = self.store.get([keys[p] for p in positions])
+            started = (self.store.waves[rows] > 0) | valid[positions]
+            positions, rows = positions[started], rows[started]
+            if len(rows) == 0:
+                continue
+            self.store.push(rows, X[positions])
+            ready = valid[positions]
+            self.store.pending[rows[~ready]] += 1
+            outputs[positions[ready]] = self._step(rows[ready])
+            outputs[positions[~ready]] = self.store.cell(rows[~ready])[1] #the output of the last wave with a class
+            waves[positions] = self.store.waves[rows] - self.store.pending[rows]
+        return outputs, waves
+
+    def score(self, records):
+        if len(records) == 0:
+            return []
+        values, classes_num = scoring.get_values(records, max(len(record['waves']) for record in records))
+        positions = [(i, j) for i, record in enumerate(records) for j in range(len(record['waves']))]
+        keys = [records[i]['id'] for i, _ in positions]
+        X = values[tuple(np.array(positions, dtype=np.int64).reshape(-1, 2).T)]
+        outputs, waves = self.update(keys, X, np.max(X[:, -classes_num:], axis=1) > 0)
+        last = {i: k for k, (i, _) in enumerate(positions) if waves[k] > 0} #the latest stepped wave of every record
+        results = []
+        for i, record in enumerate(records):
+            if i not in last:
+                results.append({'id': record['id'], 'class': None, 'scores': None})
+                continue
+            scores = runtime.softmax(outputs[last[i]]) #class of the next wave
+            results.append({'id': record['id'], 'class': int(np.argmax(scores)), 'scores': scores.tolist(), 'waves': int(waves[last[i]])})
+        return results
+
+    def close(self):
+        self.store.close()
@@ -0,0 +1,83 @@
+import tensorflow as tf
+from tensorflow.python.client import timeline
+import json
+import time
+import os
+
+class Monitor:
+
+    def __init__(self, log_path, graph=None, trace_steps=[], phase='train'):
+        os.makedirs(log_path, exist_ok=True)
+        self.log_path = log_path
+        self.trace_steps = set(trace_steps)
+        self.phase = phase
+        self.writer = tf.summary.FileWriter(os.path.join(log_path, phase), graph)
+        self.metrics = open(os.path.join(log_path, 'metrics.jsonl'), 'a')
+        self.step = 0
+        self.batch_time = 0.
+        self._reset_epoch()
+
+    def _reset_epoch(self):
+        self.epoch_start = time.perf_counter()
+        self.epoch_batch_time = 0.
+        self.epoch_run_time = 0.
+        self.epoch_samples = 0
+        self.epoch_steps = 0
+
+    def _write(self, record):
+        record['phase'] = self.phase
+        record['time'] = time.time()
+        self.metrics.write(json.dumps(record) + '\n')
+
+    def _summary(self, values, step):
+        self.writer.add_summary(tf.Summary(value=[tf.Summary.Value(tag=tag, simple_value=float(value)) for tag, value in values.items()]), step)
+
+    def batches(self, batches): #time spent waiting for the next batch, i.e. preparation not hidden by prefetching
+        iterator = iter(batches)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self.batch_time = time.perf_counter() - start
+            yield batch
+
+    def run(self, sess, fetches, feed_dict, samples):
+        options, metadata = None, None
+        if self.step in self.trace_steps:
+            options, metadata = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE), tf.RunMetadata()
+        start = time.perf_counter()
+        result = sess.run(fetches, feed_dict=feed_dict, options=options, run_metadata=metadata)
+        run_time = time.perf_counter() - start
+        if metadata is not None:
+            self.writer.add_run_metadata(metadata, 'step-{0}'.format(self.step), self.step)
+            with open(os.path.join(self.log_path, 'timeline-{0}-{1}.json'.format(self.phase, self.step)), 'w') as f:
+                f.write(timeline.Timeline(metadata.step_stats).generate_chrome_trace_format())
+
+        step_time = self.batch_time + run_time
+        self._write({'step': self.step, 'samples': samples, 'batch_seconds': self.batch_time, 'run_seconds': run_time,
+                    'samples_per_second': samples / step_time if step_time > 0 else None})
+        self.epoch_batch_time += self.batch_time
+        self.epoch_run_time += run_time
+        self.epoch_samples += samples
+        self.epoch_steps += 1
+        self.batch_time = 0.
+        self.step += 1
+        return result
+
+    def epoch(self, epoch, **values): #loss, accuracy, validation loss, learning rate...
+        seconds = time.perf_counter() - self.epoch_start
+        timings = {'seconds': seconds, 'batch_seconds': self.epoch_batch_time, 'run_seconds': self.epoch_run_time,
+                'samples_per_second': self.epoch_samples / seconds if seconds > 0 else 0.,
+                'step_seconds': seconds / max(self.epoch_steps, 1)}
+        values = {name: float(value) for name, value in values.items() if value is not None}
+        self._write(dict(values, epoch=epoch, **timings))
+        self._summary(dict(values, **timings), epoch)
+        self.writer.flush()
+        self.metrics.flush()
+        self._reset_epoch()
+
+    def close(self):
+        self.writer.close()
+        self.metrics.close()
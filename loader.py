@@ -1,45 +1,130 @@
 import numpy as np
+import struct
 import json
+import sys
+import os
 
-data = json.load(open("data/harmonized.json", 'r'))
-records_num = len(data["records"])
-waves_num = [6,2]
-attributes_num = len(data["records"][0]["waves"][0]["values"])
-classes_num = len(data["records"][0]["waves"][0]["class"]["one-hot"])
-
-values = [[],[]]
-classes = [[],[]]
-
-print("Reading dataset...")
-for i in range(len(data["records"])):
-    if(i % 1000 == 0):
-        print("Converting record n.{0}".format(i))
-
-    r = data["records"][i] #Person
-    db = r["id"].startswith("t") #0 = e_, 1 = t_
-    if(len(r["waves"]) == waves_num[db]):
-        for w in r["waves"]:
-            values[db].append(w["values"])
-            classes[db].append(w["class"]["one-hot"])
-    
-for i in range(2):
-    values[i] = np.array(values[i], dtype=np.float32)
-    values[i] = np.reshape(values[i], (-1, waves_num[i], attributes_num))
-    classes[i] = np.array(classes[i], dtype=np.float32)
-    classes[i] = np.reshape(classes[i], (-1, waves_num[i], classes_num))
-
-print("Saving...")
-np.save("./data/e_records.npy",values[0])
-np.save("./data/e_classes.npy",classes[0])
-np.save("./data/t_records.npy",values[1])
-np.save("./data/t_classes.npy",classes[1])
-print("Ending.")
-
-'''
-print("Saving...")
-np.save("./data/e_records.npy",values[0])
-np.save("./data/e_classes.npy",classes[0])
-np.save("./data/t_records.npy",values[1])
-np.save("./data/t_classes.npy",classes[1])
-print("Ending.")
-'''
\ No newline at end of file
+class NpyWriter:
+    header_size = 128
+
+    def __init__(self, path, row_shape, dtype=np.float32, chunk_size=1024):
+        self.path = path
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self.buffer = np.empty((chunk_size,) + self.row_shape, dtype=self.dtype)
+        self.buffered = 0
+        self.rows = 0
+        self.file = open(path, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        header = "{{'descr': {0}, 'fortran_order': False, 'shape': {1}, }}".format(repr(self.dtype.str), repr((self.rows,) + self.row_shape))
+        magic = np.lib.format.magic(1, 0)
+        padding = self.header_size - len(magic) - 2 - len(header) - 1
+        assert padding >= 0, "Header too long."
+        self.file.seek(0)
+        self.file.write(magic + struct.pack('<H', self.header_size - len(magic) - 2))
+        self.file.write((header + ' ' * padding + '\n').encode('latin1'))
+
+    def append(self, row):
+        self.buffer[self.buffered] = row
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.buffered > 0:
+            self.buffer[:self.buffered].tofile(self.file)
+            self.rows += self.buffered
+            self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self._write_header()
+        self.file.close()
+
+def read_records(path, chunk_size=1 << 20):
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer = ''
+        position = -1
+        while position < 0: #find the beginning of the records array
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise BaseException("Records array not found.")
+            buffer += chunk
+            key = buffer.find('"records"')
+            if key >= 0:
+                position = buffer.find('[', key)
+        position += 1
+
+        eof = False
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                if position == len(buffer):
+                    raise ValueError
+                record, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise BaseException("Malformed or truncated records array.")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield record
+
+def remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+#compact stores values as float16 and classes as uint8, pack_classes also packs the one-hot bits
+def convert(source='data/harmonized.json', destination='./data', waves_num=[6,2], chunk_size=1024, compact=False, pack_classes=False):
+    prefixes = ['e', 't']
+    values = [None, None]
+    classes = [None, None]
+    sizes = [] #attributes and classes number of the first record
+    values_dtype = np.float16 if compact else np.float32
+    classes_dtype = np.uint8 if compact or pack_classes else np.float32
+    for prefix in prefixes: #outputs of an earlier conversion are never loaded by mistake
+        for suffix in ['_records.npy', '_classes.npy', '_classes.packed.npy', '_classes.packed.json']:
+            remove(destination + "/" + prefix + suffix)
+
+    def create_writers(db, attributes_num, classes_num):
+        sizes.append((attributes_num, classes_num))
+        prefix = destination + "/" + prefixes[db]
+        values[db] = NpyWriter(prefix + "_records.npy", (waves_num[db], attributes_num), values_dtype, chunk_size)
+        if pack_classes:
+            classes[db] = NpyWriter(prefix + "_classes.packed.npy", (waves_num[db], (classes_num + 7) // 8), np.uint8, chunk_size)
+            with open(prefix + "_classes.packed.json", 'w') as f:
+                json.dump({"classes_num": classes_num}, f)
+        else:
+            classes[db] = NpyWriter(prefix + "_classes.npy", (waves_num[db], classes_num), classes_dtype, chunk_size)
+
+    print("Reading dataset...")
+    for i, r in enumerate(read_records(source)): #Person
+        if(i % 1000 == 0):
+            print("Converting record n.{0}".format(i))
+
+        db = r["id"].startswith("t") #0 = e_, 1 = t_
+        if(len(r["waves"]) == waves_num[db]):
+            if values[db] is None:
+                create_writers(db, len(r["waves"][0]["values"]), len(r["waves"][0]["class"]["one-hot"]))
+            values[db].append([w["values"] for w in r["waves"]])
+            one_hot = np.array([w["class"]["one-hot"] for w in r["waves"]], dtype=classes_dtype)
+            classes[db].append(np.packbits(one_hot, axis=-1) if pack_classes else one_hot)
+
+    print("Saving...")
+    for db in range(len(prefixes)): #empty arrays for a prefix without records, shaped as the other one
+        if values[db] is None:
+            create_writers(db, *(sizes[0] if sizes else (0, 0)))
+    for writer in values + classes:
+        writer.close()
+    print("Ending.")
+
+if __name__ == '__main__':
+    convert(compact='--compact' in sys.argv, pack_classes='--pack-classes' in sys.argv)
@@ -3,189 +3,362 @@ from networks import StackedAutoEncoder
 from networks import ForwardClassifier
 from networks import Lstm
 from utils import Utils as utils
+from cache import Cache
+from runner import Stage
+import runner
+import sweep
+import crossvalidation
+import functools
+import sys
+import dataset
 import os
 
-#--------------------folders---------------------
-
-folders_file = './folders'
-folders  = open(folders_file, 'r').read().split('\n')
-for folder in folders:
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-
 #----------------common-variables----------------
-e_values = np.load("./data/e_records.npy")
-e_classes = np.load("./data/e_classes.npy")
-t_values = np.load("./data/t_records.npy")
-t_classes = np.load("./data/t_classes.npy")
-
-e_values = np.concatenate((e_values, e_classes), axis=2)
-t_values = np.concatenate((t_values, t_classes), axis=2)
-
+data_path = './data'
+cache_path = './cache'
+seed = 0
 training_frac = 0.8
+validation_frac = 0.1
+patience = 3
+checkpoint_minutes = 10
+resume = False #continue the stages from their periodic checkpoints
+folds_num = 5
+search = 'grid' #sweep configurations, every point of the grid or random samples of it
+trials = 20 #random samples
 apply_reduction = True
 
-attributes_num = len(e_values[0][0])
-classes_num = len(e_classes[0][0])
-
-#---------------------LSTM-----------------------
-print("---------------------LSTM-----------------------")
-
-max_sequence_length = 5
+settings = ['data_path', 'cache_path', 'seed', 'training_frac', 'validation_frac', 'patience', 'checkpoint_minutes', 'resume', 'folds_num', 'search', 'trials',
+            'apply_reduction']
 
-lstm_e_values, lstm_e_classes, lstm_e_lengths = utils.rnn_shift_padding(e_values, e_classes, max_sequence_length)
-lstm_t_values, lstm_t_classes, lstm_t_lengths = utils.rnn_shift_padding(t_values, t_classes, max_sequence_length)
+#loaded by configure
+cache = None
+e_dataset, t_dataset = None, None
+e_values, e_classes, t_values, t_classes = None, None, None, None
+attributes_num, classes_num = None, None
 
-if(apply_reduction):
-    selection = np.random.choice(len(lstm_e_values), min(len(lstm_e_values), len(lstm_t_values)), replace=False)
-    lstm_e_values, lstm_e_classes, lstm_e_lengths = lstm_e_values[selection], lstm_e_classes[selection], lstm_e_lengths[selection]
-
-lstm_values = np.concatenate((lstm_e_values, lstm_t_values))
-lstm_classes = np.concatenate((lstm_e_classes, lstm_t_classes))
-lstm_lengths = np.concatenate((lstm_e_lengths, lstm_t_lengths))
-
-cost_mask = utils.get_cost_mask(lstm_classes) / 10
+#---------------------SDAE-----------------------
+sdae_parameters = dict(scope_name='basic-sdae', dims=[100], encoding_functions=['relu'], decoding_functions=['sigmoid'], 
+                    noise=['mask-0.5'], epoch=[10], loss_functions=['rmse'], optimization_function='gradient-descent', learning_rate=0.05, 
+                    batch_size=128, checkpoint_minutes=checkpoint_minutes)
+
+def build_sdae(**parameters):
+    return StackedAutoEncoder(input_size=attributes_num, **dict(sdae_parameters, **parameters))
+    '''
+    sdae = StackedAutoEncoder(input_size=attributes_num, dims=[150, 100, 50], encoding_functions=['tanh', 'tanh', 'relu'], 
+                            decoding_functions=['sigmoid', 'sigmoid', 'sigmoid'], noise=['mask-0.7','gaussian','gaussian'], epoch=[10, 10, 10], 
+                            loss_functions=['sigmoid-cross-entropy','rmse','rmse'], optimization_function='adam', learning_rate=0.01, batch_size=128)
+    '''
 
-input_size = len(lstm_values[0][0])
-output_size = len(lstm_classes[0][0])
-lstm = Lstm(scope_name='basic-lstm', max_sequence_length=max_sequence_length, input_size=input_size, state_size=50, 
-            output_size=output_size, loss_function='weighted-sparse-softmax-cross-entropy', initialization_function='xavier',
-            optimization_function='gradient-descent', learning_rate=0.05, learning_rate_decay='fraction', batch_size=32, 
-            epoch=10, cost_mask=cost_mask, noise='gaussian')
+#---------------------LSTM-----------------------
+max_sequence_length = 5
 
-lstm_train, lstm_test = utils.generate_rnn_train_test(lstm_values, lstm_classes, lstm_lengths, training_frac)
-print("Training LSTM...")
-lstm.train(lstm_train[0], lstm_train[1], lstm_train[2])
-print("Error on training set:")
-lstm.test(lstm_train[0], lstm_train[1], lstm_train[2])
-print("Error on test set:")
-lstm.test(lstm_test[0], lstm_test[1], lstm_test[2])
+lstm_parameters = dict(scope_name='basic-lstm', max_sequence_length=max_sequence_length, state_size=50, 
+                    loss_function='weighted-sparse-softmax-cross-entropy', initialization_function='xavier',
+                    optimization_function='gradient-descent', learning_rate=0.05, learning_rate_decay='fraction', batch_size=32, 
+                    epoch=10, noise='gaussian', bucketing=True, patience=patience, checkpoint_minutes=checkpoint_minutes)
+
+def lstm_dataset():
+    lstm_e_values, lstm_e_classes, lstm_e_lengths = dataset.rnn_shift_padding(e_values, e_classes, lstm_parameters['max_sequence_length'], cache=cache)
+    lstm_t_values, lstm_t_classes, lstm_t_lengths = dataset.rnn_shift_padding(t_values, t_classes, lstm_parameters['max_sequence_length'], cache=cache)
+
+    if(apply_reduction):
+        selection = np.random.choice(len(lstm_e_values), min(len(lstm_e_values), len(lstm_t_values)), replace=False)
+        lstm_e_values, lstm_e_classes, lstm_e_lengths = dataset.take(lstm_e_values, selection), dataset.take(lstm_e_classes, selection), lstm_e_lengths[selection]
+
+    lstm_values = dataset.concatenate((lstm_e_values, lstm_t_values))
+    lstm_classes = dataset.concatenate((lstm_e_classes, lstm_t_classes))
+    lstm_lengths = np.concatenate((lstm_e_lengths, lstm_t_lengths))
+
+    cost_mask = utils.get_cost_mask(lstm_classes) / 10
+    return lstm_values, lstm_classes, lstm_lengths, cost_mask
+
+def lstm_data():
+    lstm_values, lstm_classes, lstm_lengths, cost_mask = lstm_dataset()
+    lstm_train, lstm_test = utils.generate_rnn_train_test(lstm_values, lstm_classes, lstm_lengths, training_frac)
+    lstm_train, lstm_validation = utils.generate_rnn_train_test(lstm_train[0], lstm_train[1], lstm_train[2], 1 - validation_frac)
+    return lstm_train, lstm_validation, lstm_test, cost_mask
+
+def build_lstm(lstm_train, cost_mask, **parameters):
+    return Lstm(input_size=lstm_train[0].shape[2], output_size=lstm_train[1].shape[2], cost_mask=cost_mask, **dict(lstm_parameters, **parameters))
+
+def lstm_stage():
+    np.random.seed(seed)
+    print("---------------------LSTM-----------------------")
+    lstm_train, lstm_validation, lstm_test, cost_mask = lstm_data()
+    lstm = build_lstm(lstm_train, cost_mask)
+
+    print("Training LSTM...")
+    lstm.train(lstm_train[0], lstm_train[1], lstm_train[2], validation=lstm_validation, resume=resume)
+    print("Error on training set:")
+    lstm.test(lstm_train[0], lstm_train[1], lstm_train[2])
+    print("Error on test set:")
+    lstm.test(lstm_test[0], lstm_test[1], lstm_test[2])
+    lstm.export(lstm.weights_path + '.npz') #for runtime.load
+
+def lstm_objective(parameters, weights_path):
+    np.random.seed(seed) #every trial sees the same split
+    lstm_train, lstm_validation, _, cost_mask = lstm_data()
+    lstm = build_lstm(lstm_train, cost_mask, weights_path=weights_path, log_path=weights_path, **parameters)
+    return lstm.train(lstm_train[0], lstm_train[1], lstm_train[2], validation=lstm_validation)
+
+def lstm_fold(fold, weights_path):
+    np.random.seed(seed) #every fold sees the same partition
+    lstm_values, lstm_classes, lstm_lengths, cost_mask = lstm_dataset()
+    lstm_train, lstm_test = utils.generate_rnn_folds(lstm_values, lstm_classes, lstm_lengths, folds_num, stratified=True)[fold]
+    lstm_train, lstm_validation = utils.generate_rnn_train_test(lstm_train[0], lstm_train[1], lstm_train[2], 1 - validation_frac)
+    lstm = build_lstm(lstm_train, cost_mask, weights_path=weights_path, log_path=weights_path)
+    lstm.train(lstm_train[0], lstm_train[1], lstm_train[2], validation=lstm_validation)
+    return lstm.test(lstm_test[0], lstm_test[1], lstm_test[2])
 
 #---------------------SDAE-----------------------
-print("---------------------SDAE-----------------------")
-sdae_e_values = np.reshape(e_values,(-1, attributes_num))
-sdae_t_values = np.reshape(t_values,(-1, attributes_num))
-sdae_e_classes = np.reshape(e_classes,(-1, classes_num))
-sdae_t_classes = np.reshape(t_classes,(-1, classes_num))
-
-sdae_e_values, sdae_e_classes = utils.homogenize(sdae_e_values, sdae_e_classes, 0.3)
-sdae_t_values, sdae_t_classes = utils.homogenize(sdae_t_values, sdae_t_classes, 0.3)
-
-if(apply_reduction):
-    selection = np.random.choice(len(sdae_e_values), min(len(sdae_e_values), len(sdae_t_values)), replace=False)
-    sdae_e_values = sdae_e_values[selection]
-
-sdae_values = np.concatenate((sdae_e_values, sdae_t_values))
-sdae_classes = np.concatenate((sdae_e_values, sdae_t_values))
-
-
-sdae = StackedAutoEncoder(scope_name='basic-sdae', input_size=attributes_num, dims=[100], encoding_functions=['relu'], decoding_functions=['sigmoid'], 
-                        noise=['mask-0.5'], epoch=[10], loss_functions=['rmse'], optimization_function='gradient-descent', learning_rate=0.05, 
-                        batch_size=128)
-'''
-sdae = StackedAutoEncoder(input_size=attributes_num, dims=[150, 100, 50], encoding_functions=['tanh', 'tanh', 'relu'], 
-                        decoding_functions=['sigmoid', 'sigmoid', 'sigmoid'], noise=['mask-0.7','gaussian','gaussian'], epoch=[10, 10, 10], 
-                        loss_functions=['sigmoid-cross-entropy','rmse','rmse'], optimization_function='adam', learning_rate=0.01, batch_size=128)
-'''
-
-sdae_train, sdae_test = utils.generate_sdae_train_test(sdae_values, training_frac)
-print("Training SDAE...")
-sdae.train(sdae_values)
-print("Finetuning SDAE...")
-sdae.finetune(sdae_train)
-#sdae.test(sdae_train, 10, threshold=0.1)
+def sdae_data():
+    sdae_e_values = e_dataset.flat_values
+    sdae_t_values = t_dataset.flat_values
+    sdae_e_classes = e_dataset.flat_classes
+    sdae_t_classes = t_dataset.flat_classes
+
+    sdae_e_values, sdae_e_classes = dataset.homogenize(sdae_e_values, sdae_e_classes, 0.3, cache=cache, seed=seed)
+    sdae_t_values, sdae_t_classes = dataset.homogenize(sdae_t_values, sdae_t_classes, 0.3, cache=cache, seed=seed)
+
+    if(apply_reduction):
+        selection = np.random.choice(len(sdae_e_values), min(len(sdae_e_values), len(sdae_t_values)), replace=False)
+        sdae_e_values = dataset.take(sdae_e_values, selection)
+
+    return dataset.concatenate((sdae_e_values, sdae_t_values))
+
+def sdae_stage():
+    np.random.seed(seed)
+    print("---------------------SDAE-----------------------")
+    sdae_values = sdae_data()
+    sdae = build_sdae()
+
+    sdae_train, sdae_test = utils.generate_sdae_train_test(sdae_values, training_frac)
+    print("Training SDAE...")
+    sdae.train(sdae_values, resume=resume)
+    print("Finetuning SDAE...")
+    sdae.finetune(sdae_train, resume=resume)
+    print("Error on test set:")
+    sdae.test(sdae_test, 0, classes_num=classes_num) #classes recovered from the reconstruction
+    sdae.export(sdae.weights_path + '.npz')
+
+def sdae_objective(parameters, weights_path):
+    np.random.seed(seed) #every trial sees the same split
+    sdae_train, _ = utils.generate_sdae_train_test(sdae_data(), training_frac)
+    sdae_train, sdae_validation = utils.generate_sdae_train_test(sdae_train, 1 - validation_frac)
+    if 'epoch' in parameters and not isinstance(parameters['epoch'], list): #a sweep budget applies to every layer
+        parameters = dict(parameters, epoch=[parameters['epoch']] * len(parameters.get('dims', sdae_parameters['dims'])))
+    sdae = build_sdae(weights_path=weights_path, log_path=weights_path, **parameters)
+    sdae.train(sdae_train, validation=sdae_validation)
+    return sdae.finetune(sdae_train, validation=sdae_validation)
+
+def sdae_fold(fold, weights_path):
+    np.random.seed(seed) #every fold sees the same partition
+    sdae_train, sdae_test = utils.generate_sdae_folds(sdae_data(), folds_num)[fold]
+    sdae_train, sdae_validation = utils.generate_sdae_train_test(sdae_train, 1 - validation_frac)
+    sdae = build_sdae(weights_path=weights_path, log_path=weights_path)
+    sdae.train(sdae_train, validation=sdae_validation)
+    sdae.finetune(sdae_train, validation=sdae_validation)
+    return sdae.test(sdae_test, 0, classes_num=classes_num)
 
 #-----------------feed-forward-------------------
-print("-----------------feed-forward-------------------")
-classifier_e_values = np.reshape(e_values,(-1, attributes_num))
-classifier_t_values = np.reshape(t_values,(-1, attributes_num))
-classifier_e_classes = np.reshape(e_classes,(-1, classes_num))
-classifier_t_classes = np.reshape(t_classes,(-1, classes_num))
-
-classifier_e_values, classifier_e_classes = utils.homogenize(classifier_e_values, classifier_e_classes, 0.3)
-classifier_t_values, classifier_t_classes = utils.homogenize(classifier_t_values, classifier_t_classes, 0.3)
-
-if(apply_reduction):
-    selection = np.random.choice(len(classifier_e_values), min(len(classifier_e_values), len(classifier_t_values)), replace=False)
-    classifier_e_values, classifier_e_classes = classifier_e_values[selection], classifier_e_classes[selection]
-
-classifier_values = np.concatenate((classifier_e_values, classifier_t_values))
-classifier_classes = np.concatenate((classifier_e_classes, classifier_t_classes))
-
-classifier = ForwardClassifier(scope_name='basic-forward', input_size=attributes_num, output_size=classes_num, dims=[80,20], 
-                            activation_functions=['relu','relu'], output_activation_function='softmax', loss_function='rmse', 
-                            optimization_function='adam', epoch=10, learning_rate=0.05, batch_size=128)
-
-classifier_train, classifier_test = utils.generate_classifier_train_test(classifier_values, classifier_classes, training_frac)
-print("Training Classifier...")
-classifier.train(classifier_train[0], classifier_train[1])
-print("Error on training set:")
-classifier.test(classifier_train[0], classifier_train[1])
-print("Error on test set:")
-classifier.test(classifier_test[0], classifier_test[1])
+forward_parameters = dict(scope_name='basic-forward', dims=[80,20], activation_functions=['relu','relu'], output_activation_function='softmax', 
+                        loss_function='rmse', optimization_function='adam', epoch=10, learning_rate=0.05, batch_size=128, patience=patience,
+                        checkpoint_minutes=checkpoint_minutes)
+
+def classifier_dataset():
+    classifier_e_values = e_dataset.flat_values
+    classifier_t_values = t_dataset.flat_values
+    classifier_e_classes = e_dataset.flat_classes
+    classifier_t_classes = t_dataset.flat_classes
+
+    classifier_e_values, classifier_e_classes = dataset.homogenize(classifier_e_values, classifier_e_classes, 0.3, cache=cache, seed=seed)
+    classifier_t_values, classifier_t_classes = dataset.homogenize(classifier_t_values, classifier_t_classes, 0.3, cache=cache, seed=seed)
+
+    if(apply_reduction):
+        selection = np.random.choice(len(classifier_e_values), min(len(classifier_e_values), len(classifier_t_values)), replace=False)
+        classifier_e_values, classifier_e_classes = dataset.take(classifier_e_values, selection), dataset.take(classifier_e_classes, selection)
+
+    classifier_values = dataset.concatenate((classifier_e_values, classifier_t_values))
+    classifier_classes = dataset.concatenate((classifier_e_classes, classifier_t_classes))
+    return classifier_values, classifier_classes
+
+def classifier_data():
+    classifier_values, classifier_classes = classifier_dataset()
+    classifier_train, classifier_test = utils.generate_classifier_train_test(classifier_values, classifier_classes, training_frac)
+    classifier_train, classifier_validation = utils.generate_classifier_train_test(classifier_train[0], classifier_train[1], 1 - validation_frac)
+    return classifier_train, classifier_validation, classifier_test
+
+def build_classifier(input_size=None, **parameters): #the attributes unless the values are encoded
+    return ForwardClassifier(input_size=attributes_num if input_size is None else input_size, output_size=classes_num, **dict(forward_parameters, **parameters))
+
+def forward_stage():
+    np.random.seed(seed)
+    print("-----------------feed-forward-------------------")
+    classifier_train, classifier_validation, classifier_test = classifier_data()
+    classifier = build_classifier()
+
+    print("Training Classifier...")
+    classifier.train(classifier_train[0], classifier_train[1], validation=classifier_validation, resume=resume)
+    print("Error on training set:")
+    classifier.test(classifier_train[0], classifier_train[1])
+    print("Error on test set:")
+    classifier.test(classifier_test[0], classifier_test[1])
+    classifier.export(classifier.weights_path + '.npz')
+
+def forward_objective(parameters, weights_path):
+    np.random.seed(seed) #every trial sees the same split
+    classifier_train, classifier_validation, _ = classifier_data()
+    classifier = build_classifier(weights_path=weights_path, log_path=weights_path, **parameters)
+    return classifier.train(classifier_train[0], classifier_train[1], validation=classifier_validation)
+
+def forward_fold(fold, weights_path):
+    np.random.seed(seed) #every fold sees the same partition
+    classifier_values, classifier_classes = classifier_dataset()
+    classifier_train, classifier_test = utils.generate_classifier_folds(classifier_values, classifier_classes, folds_num, stratified=True)[fold]
+    classifier_train, classifier_validation = utils.generate_classifier_train_test(classifier_train[0], classifier_train[1], 1 - validation_frac)
+    classifier = build_classifier(weights_path=weights_path, log_path=weights_path)
+    classifier.train(classifier_train[0], classifier_train[1], validation=classifier_validation)
+    return classifier.test(classifier_test[0], classifier_test[1])
+
+#------------------sweep-spaces------------------
+sweeps = {
+    'lstm': (lstm_objective, {'state_size': [25, 50, 100], 'learning_rate': [0.01, 0.05, 0.1], 'batch_size': [32, 128], 'noise': ['none', 'gaussian']}),
+    'sdae': (sdae_objective, {'dims': [[50], [100], [150]], 'noise': [['mask-0.3'], ['mask-0.5'], ['gaussian']], 'learning_rate': [0.01, 0.05, 0.1]}),
+    'forward': (forward_objective, {'dims': [[40,20], [80,20], [120,40]], 'learning_rate': [0.005, 0.01, 0.05], 'batch_size': [32, 128]})
+}
+
+crossvalidations = {'lstm': lstm_fold, 'sdae': sdae_fold, 'forward': forward_fold}
 
 #---------------sdae-feed-forward----------------
-print("---------------sdae-feed-forward----------------")
-sdae_classifier_e_values = sdae.encode(np.reshape(e_values,(-1, attributes_num)))
-sdae_classifier_t_values = sdae.encode(np.reshape(t_values,(-1, attributes_num)))
-sdae_classifier_e_classes = np.reshape(e_classes,(-1, classes_num))
-sdae_classifier_t_classes = np.reshape(t_classes,(-1, classes_num))
-
-sdae_classifier_e_values, sdae_classifier_e_classes = utils.homogenize(sdae_classifier_e_values, sdae_classifier_e_classes, 0.3)
-sdae_classifier_t_values, sdae_classifier_t_classes = utils.homogenize(sdae_classifier_t_values, sdae_classifier_t_classes, 0.3)
-
-if(apply_reduction):
-    selection = np.random.choice(len(sdae_classifier_e_values), min(len(sdae_classifier_e_values), len(sdae_classifier_t_values)), replace=False)
-    sdae_classifier_e_values, sdae_classifier_e_classes = sdae_classifier_e_values[selection], sdae_classifier_e_classes[selection]
-
-sdae_classifier_values = np.concatenate((sdae_classifier_e_values, sdae_classifier_t_values))
-sdae_classifier_classes = np.concatenate((sdae_classifier_e_classes, sdae_classifier_t_classes))
-
-input_size = len(sdae_classifier_values[0])
-sdae_classifier = ForwardClassifier(scope_name='sdae-forward', input_size=input_size, output_size=classes_num, dims=[80,20], 
-                            activation_functions=['relu','relu'], output_activation_function='softmax', loss_function='rmse', 
-                            optimization_function='adam', epoch=10, learning_rate=0.05, batch_size=128)
-
-sdae_classifier_train, sdae_classifier_test = utils.generate_classifier_train_test(sdae_classifier_values, sdae_classifier_classes, training_frac)
-print("Training SDAE Classifier...")
-sdae_classifier.train(sdae_classifier_train[0], sdae_classifier_train[1])
-print("Error on training set:")
-sdae_classifier.test(sdae_classifier_train[0], sdae_classifier_train[1])
-print("Error on test set:")
+def sdae_forward_stage():
+    np.random.seed(seed)
+    sdae = build_sdae()
+    print("---------------sdae-feed-forward----------------")
+    sdae_classifier_e_values = cache.get_or_compute(sdae.encode, e_dataset.flat_values, dependencies=[sdae.weights_path])
+    sdae_classifier_t_values = cache.get_or_compute(sdae.encode, t_dataset.flat_values, dependencies=[sdae.weights_path])
+    sdae_classifier_e_classes = e_dataset.flat_classes
+    sdae_classifier_t_classes = t_dataset.flat_classes
+
+    sdae_classifier_e_values, sdae_classifier_e_classes = dataset.homogenize(sdae_classifier_e_values, sdae_classifier_e_classes, 0.3, cache=cache, seed=seed)
+    sdae_classifier_t_values, sdae_classifier_t_classes = dataset.homogenize(sdae_classifier_t_values, sdae_classifier_t_classes, 0.3, cache=cache, seed=seed)
+
+    if(apply_reduction):
+        selection = np.random.choice(len(sdae_classifier_e_values), min(len(sdae_classifier_e_values), len(sdae_classifier_t_values)), replace=False)
+        sdae_classifier_e_values, sdae_classifier_e_classes = dataset.take(sdae_classifier_e_values, selection), dataset.take(sdae_classifier_e_classes, selection)
+
+    sdae_classifier_values = dataset.concatenate((sdae_classifier_e_values, sdae_classifier_t_values))
+    sdae_classifier_classes = dataset.concatenate((sdae_classifier_e_classes, sdae_classifier_t_classes))
+
+    sdae_classifier_train, sdae_classifier_test = utils.generate_classifier_train_test(sdae_classifier_values, sdae_classifier_classes, training_frac)
+    sdae_classifier = build_classifier(input_size=sdae_classifier_values.shape[1], scope_name='sdae-forward')
+    print("Training SDAE Classifier...")
+    sdae_classifier_train, sdae_classifier_validation = utils.generate_classifier_train_test(sdae_classifier_train[0], sdae_classifier_train[1], 1 - validation_frac)
+    sdae_classifier.train(sdae_classifier_train[0], sdae_classifier_train[1], validation=sdae_classifier_validation, resume=resume)
+    print("Error on training set:")
+    sdae_classifier.test(sdae_classifier_train[0], sdae_classifier_train[1])
+    print("Error on test set:")
+    sdae_classifier.test(sdae_classifier_test[0], sdae_classifier_test[1])
+    sdae_classifier.export(sdae_classifier.weights_path + '.npz')
 
 #-------------------SDAE-LSTM--------------------
-print("-------------------SDAE-LSTM--------------------")
-sdae_lstm_e_values = np.array(sdae.timeseries_encode(e_values))
-sdae_lstm_t_values = np.array(sdae.timeseries_encode(t_values))
-sdae_lstm_e_classes = e_classes
-sdae_lstm_t_classes = t_classes
-
-max_sequence_length = 5
+def sdae_lstm_stage():
+    np.random.seed(seed)
+    sdae = build_sdae()
+    print("-------------------SDAE-LSTM--------------------")
+    sdae_lstm_e_values = cache.get_or_compute(sdae.timeseries_encode, e_values, dependencies=[sdae.weights_path])
+    sdae_lstm_t_values = cache.get_or_compute(sdae.timeseries_encode, t_values, dependencies=[sdae.weights_path])
+    sdae_lstm_e_classes = e_classes
+    sdae_lstm_t_classes = t_classes
+
+    max_sequence_length = lstm_parameters['max_sequence_length']
+
+    sdae_lstm_e_values, sdae_lstm_e_classes, sdae_lstm_e_lengths = dataset.rnn_shift_padding(sdae_lstm_e_values, sdae_lstm_e_classes, max_sequence_length, cache=cache)
+    sdae_lstm_t_values, sdae_lstm_t_classes, sdae_lstm_t_lengths = dataset.rnn_shift_padding(sdae_lstm_t_values, sdae_lstm_t_classes, max_sequence_length, cache=cache)
+
+    if(apply_reduction):
+        selection = np.random.choice(len(sdae_lstm_e_values), min(len(sdae_lstm_e_values), len(sdae_lstm_t_values)), replace=False)
+        sdae_lstm_e_values, sdae_lstm_e_classes, sdae_lstm_e_lengths = dataset.take(sdae_lstm_e_values, selection), dataset.take(sdae_lstm_e_classes, selection), sdae_lstm_e_lengths[selection]
+
+    sdae_lstm_values = dataset.concatenate((sdae_lstm_e_values, sdae_lstm_t_values))
+    sdae_lstm_classes = dataset.concatenate((sdae_lstm_e_classes, sdae_lstm_t_classes))
+    sdae_lstm_lengths = np.concatenate((sdae_lstm_e_lengths, sdae_lstm_t_lengths))
+
+    cost_mask = utils.get_cost_mask(sdae_lstm_classes) / 10
+
+    sdae_lstm_train, sdae_lstm_test = utils.generate_rnn_train_test(sdae_lstm_values, sdae_lstm_classes, sdae_lstm_lengths, training_frac)
+    sdae_lstm = build_lstm(sdae_lstm_train, cost_mask, scope_name='sdae-lstm')
+    print("Training LSTM...")
+    sdae_lstm_train, sdae_lstm_validation = utils.generate_rnn_train_test(sdae_lstm_train[0], sdae_lstm_train[1], sdae_lstm_train[2], 1 - validation_frac)
+    sdae_lstm.train(sdae_lstm_train[0], sdae_lstm_train[1], sdae_lstm_train[2], validation=sdae_lstm_validation, resume=resume)
+    print("Error on training set:")
+    sdae_lstm.test(sdae_lstm_train[0], sdae_lstm_train[1], sdae_lstm_train[2])
+    print("Error on test set:")
+    sdae_lstm.test(sdae_lstm_test[0], sdae_lstm_test[1], sdae_lstm_test[2])
+    sdae_lstm.export(sdae_lstm.weights_path + '.npz')
+
+#--------------------configure-------------------
+parameters = {'lstm': lstm_parameters, 'sdae': sdae_parameters, 'forward': forward_parameters}
+
+def configure(config={}): #the settings and network parameters of a config file, then the datasets
+    global cache, e_dataset, t_dataset, e_values, e_classes, t_values, t_classes, attributes_num, classes_num
+    unknown = set(config) - set(settings) - set(parameters)
+    assert not unknown, "Unknown settings: " + ", ".join(sorted(unknown))
+    globals().update({name: config[name] for name in settings if name in config})
+    for name, network_parameters in parameters.items():
+        network_parameters.update({key: globals()[key] for key in ['patience', 'checkpoint_minutes'] if key in network_parameters})
+        network_parameters.update(config.get(name, {}))
+
+    cache = Cache(cache_path)
+    e_dataset = dataset.Dataset(data_path, "e")
+    t_dataset = dataset.Dataset(data_path, "t")
+    e_values, e_classes = e_dataset.values, e_dataset.classes #values and classes concatenated lazily
+    t_values, t_classes = t_dataset.values, t_dataset.classes
+    attributes_num = e_values.shape[2]
+    classes_num = e_classes.shape[2]
+
+def configured(config, function, *args): #spawned workers import this module unconfigured
+    configure(config)
+    return function(*args)
+
+stages = {'lstm': (lstm_stage, []), 'sdae': (sdae_stage, []), 'forward': (forward_stage, []),
+          'sdae-forward': (sdae_forward_stage, ['sdae']), 'sdae-lstm': (sdae_lstm_stage, ['sdae'])}
+
+def train(names, config={}, workers=None): #dependencies left out are expected to be trained already
+    return runner.run([Stage(name, functools.partial(configured, config, stages[name][0]), [d for d in stages[name][1] if d in names]) for name in names], workers)
+
+def run_sweep(name, config={}, workers=None):
+    objective, space = sweeps[name]
+    mode = config.get('search', search)
+    assert mode in ['grid', 'random'], "Invalid search."
+    configurations = sweep.grid(space) if mode == 'grid' else sweep.sample(space, config.get('trials', trials), config.get('seed', seed))
+    rows = sweep.successive_halving(functools.partial(configured, config, objective), configurations, min_budget=1, max_budget=27, eta=3,
+                                    path='./weights/sweep/' + name, workers=workers)
+    sweep.print_table(rows)
+    sweep.save_table(rows, './logs/sweep-' + name + '.csv')
+    print("Best:", sweep.best(rows))
+    return rows
+
+def run_folds(name, config={}, workers=None):
+    results = crossvalidation.run(functools.partial(configured, config, crossvalidations[name]), config.get('folds_num', folds_num),
+                                  path='./weights/folds/' + name, workers=workers)
+    summary = crossvalidation.summarize(results)
+    crossvalidation.print_summary(summary)
+    return summary
 
-sdae_lstm_e_values, sdae_lstm_e_classes, sdae_lstm_e_lengths = utils.rnn_shift_padding(sdae_lstm_e_values, sdae_lstm_e_classes, max_sequence_length)
-sdae_lstm_t_values, sdae_lstm_t_classes, sdae_lstm_t_lengths = utils.rnn_shift_padding(sdae_lstm_t_values, sdae_lstm_t_classes, max_sequence_length)
-
-if(apply_reduction):
-    selection = np.random.choice(len(sdae_lstm_e_values), min(len(sdae_lstm_e_values), len(sdae_lstm_t_values)), replace=False)
-    sdae_lstm_e_values, sdae_lstm_e_classes, sdae_lstm_e_lengths = sdae_lstm_e_values[selection], sdae_lstm_e_classes[selection], sdae_lstm_e_lengths[selection]
-
-sdae_lstm_values = np.concatenate((sdae_lstm_e_values, sdae_lstm_t_values))
-sdae_lstm_classes = np.concatenate((sdae_lstm_e_classes, sdae_lstm_t_classes))
-sdae_lstm_lengths = np.concatenate((sdae_lstm_e_lengths, sdae_lstm_t_lengths))
-
-cost_mask = utils.get_cost_mask(sdae_lstm_classes) / 10
-
-input_size = len(sdae_lstm_values[0][0])
-output_size = len(sdae_lstm_classes[0][0])
-sdae_lstm = Lstm(scope_name='sdae-lstm', max_sequence_length=max_sequence_length, input_size=input_size, state_size=50, 
-            output_size=output_size, loss_function='weighted-sparse-softmax-cross-entropy', initialization_function='xavier', 
-            optimization_function='gradient-descent', learning_rate=0.05, learning_rate_decay='fraction', batch_size=32, 
-            epoch=10, cost_mask=cost_mask, noise='gaussian')
-
-sdae_lstm_train, sdae_lstm_test = utils.generate_rnn_train_test(sdae_lstm_values, sdae_lstm_classes, sdae_lstm_lengths, training_frac)
-print("Training LSTM...")
-sdae_lstm.train(sdae_lstm_train[0],sdae_lstm_train[1], sdae_lstm_train[2])
-print("Error on training set:")
-sdae_lstm.test(sdae_lstm_train[0], sdae_lstm_train[1], sdae_lstm_train[2])
-print("Error on test set:")
-sdae_lstm.test(sdae_lstm_test[0], sdae_lstm_test[1], sdae_lstm_test[2])
\ No newline at end of file
+#--------------------folders---------------------
+def make_folders(folders_file='./folders'):
+    folders  = open(folders_file, 'r').read().split('\n')
+    for folder in folders:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+if __name__ == '__main__':
+    make_folders()
+    config = {'resume': '--resume' in sys.argv}
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'sweep': #python main.py sweep lstm|sdae|forward
+        run_sweep(sys.argv[2], config)
+    elif len(sys.argv) > 2 and sys.argv[1] == 'folds': #python main.py folds lstm|sdae|forward
+        run_folds(sys.argv[2], config)
+    else:
+        train(list(stages), config)
@@ -1,3 +1,4 @@
 from .forward_classifier import ForwardClassifier
 from .lstm import Lstm
 from .stacked_autoencoder import StackedAutoEncoder
+from .predictor import Predictor
@@ -1,6 +1,12 @@
 import numpy as np
 import tensorflow as tf
 from utils import Utils as utils
+from training import get_learning_rate
+import checkpoint
+from .predictor import Predictor
+from . import trainer
+from evaluation import ConfusionMatrix
+import runtime
 
 class ForwardClassifier:
 
@@ -10,13 +16,15 @@ class ForwardClassifier:
         assert self.epoch > 0, "No. of epoch must be at least 1"
 
     def __init__(self, input_size, output_size, dims, activation_functions, output_activation_function, loss_function, optimization_function='gradient-descent', epoch=1000,
-                 learning_rate=0.001, learning_rate_decay='none', batch_size=100, scope_name='default'):
+                 learning_rate=0.001, learning_rate_decay='none', batch_size=100, scope_name='default', prefetch=4, patience=0, weights_path=None, log_path=None, trace_steps=[],
+                 checkpoint_steps=0, checkpoint_minutes=0, checkpoint_keep=3):
         self.input_size = input_size
         self.output_size = output_size
         self.batch_size = batch_size
         self.learning_rate = learning_rate
         self.learning_rate_decay = learning_rate_decay
-        self.initial_learning_rate = utils.get_learning_rate(self.learning_rate_decay, self.learning_rate, 0)
+        self.initial_learning_rate = get_learning_rate(self.learning_rate_decay, self.learning_rate, 0)
+        self.patience = patience
         self.loss_function = loss_function
         self.optimization_function = optimization_function
         self.output_activation_function = output_activation_function
@@ -24,16 +32,26 @@ class ForwardClassifier:
         self.epoch = epoch
         self.dims = dims
         self.scope_name = scope_name
+        self.prefetch = prefetch
+        self.weights_path = weights_path if weights_path is not None else './weights/forward/' + self.scope_name
+        self.log_path = log_path if log_path is not None else './logs/forward/' + self.scope_name
+        self.trace_steps = trace_steps
+        self.checkpoint_steps = checkpoint_steps
+        self.checkpoint_minutes = checkpoint_minutes
+        self.checkpoint_keep = checkpoint_keep
+        self.predictor = None
         self.assertions()
-        self.activation_functions.append(self.output_activation_function)
+        self.activation_functions = self.activation_functions + [self.output_activation_function] #the caller list is left untouched
         self.depth = len(dims)
         self.weights, self.biases = [], []
+        self.graph = tf.Graph()
         self._create_model()
 
     def _create_model(self):
-        with tf.variable_scope(self.scope_name) as scope:
+        with self.graph.as_default(), tf.variable_scope(self.scope_name) as scope:
             self.x = tf.placeholder(dtype=tf.float32, shape=[None, self.input_size], name='x')
             self.y = tf.placeholder(dtype=tf.float32, shape=[None, self.output_size], name='y')
+            self.learning_rate_tensor = tf.placeholder(dtype=tf.float32, shape=[], name='learning_rate')
             
             if(self.depth > 0):
                 hidden_size = self.dims[0]
@@ -61,39 +79,83 @@ class ForwardClassifier:
             self.output = outputs
 
             self.loss = utils.get_loss(logits=outputs, labels=self.y, name=self.loss_function)
-            self.optimizer = utils.get_optimizer(name=self.optimization_function, learning_rate=self.learning_rate).minimize(self.loss)
+            self.optimizer = utils.get_optimizer(name=self.optimization_function, learning_rate=self.learning_rate_tensor).minimize(self.loss)
 
             correct_prediction = tf.equal(tf.argmax(self.output, 1), tf.argmax(self.y, 1))
             self.accuracy = tf.reduce_mean(tf.cast(correct_prediction, tf.float32))
 
-            #Saver
-            self.saver = tf.train.Saver()
+            #Metrics
+            [self.avg_loss, self.avg_accuracy], metrics_update, self.metrics_reset = utils.get_running_means([self.loss, self.accuracy], 'metrics', [self.optimizer]) #the values come from the forward pass the step used, added once the step is done
+            self.train_step = tf.group(self.optimizer, metrics_update)
 
-            #Tensorboard
-            #writer = tf.summary.FileWriter("C:\\Users\\danie\\Documents\\SDA-LSTM\\logs", graph=tf.get_default_graph())
+            #Saver and initializer of this model only, its graph holds nothing else
+            self.variables = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope=scope.name + '/') #weights and optimizer state
+            self.saver = tf.train.Saver(var_list=self.variables)
+            self.initializer = tf.variables_initializer(tf.global_variables())
 
-    def train(self, X, Y):
+    def _batches(self, X, Y, batches_per_epoch):
+        for i in range(batches_per_epoch):
+            yield utils.get_batch(X, Y, self.batch_size)
+
+    def _validation_loss(self, sess, X, Y):
+        total_loss = 0.
+        for start in range(0, len(X), self.batch_size):
+            batch_x, batch_y = utils.get_sequential_batch(X, Y, start, self.batch_size)
+            total_loss += sess.run(self.loss, feed_dict={self.x: batch_x, self.y: batch_y}) * len(batch_x)
+        return total_loss / len(X)
+
+    def train(self, X, Y, validation=None, resume=False):
         batches_per_epoch = int(len(X) / self.batch_size)
+        validation_loss = None
+        if validation is not None:
+            validation_loss = lambda sess: self._validation_loss(sess, validation[0], validation[1])
+        checkpointer = self._checkpointer()
+
+        with utils.get_session(self.graph) as sess:
+            sess.run(self.initializer)
+            state = checkpointer.restore(sess) if resume else None
+            if state is None:
+                checkpointer.clear()
+            best_loss = trainer.fit(self, sess, lambda: self._batches(X, Y, batches_per_epoch), [self.x, self.y], self.train_step,
+                                    {'loss': self.avg_loss, 'accuracy': self.avg_accuracy}, self.metrics_reset, validation_loss, self.epoch, checkpointer, state)
+            checkpointer.close()
+            if validation is None:
+                self.saver.save(sess, self.weights_path + '/checkpoint', global_step=0)
+        return best_loss
+
+    def _checkpointer(self, name='periodic'):
+        return checkpoint.Checkpointer(self.weights_path + '/' + name, self.variables, self.checkpoint_steps, self.checkpoint_minutes, self.checkpoint_keep)
+
+    def get_predictor(self):
+        if self.predictor is None:
+            self.predictor = Predictor(self.saver, self.weights_path, self.graph)
+        return self.predictor
+
+    def export(self, path):
+        weights, biases = self.get_predictor().run([self.weights, self.biases], feed_dict={})
+        arrays = {}
+        for i in range(len(weights)):
+            arrays['weights_{0}'.format(i)], arrays['biases_{0}'.format(i)] = weights[i], biases[i]
+        runtime.save(path, 'forward', {'activation_functions': self.activation_functions}, arrays)
+
+    def predict(self, X, chunk_size=65536):
+        predictor = self.get_predictor()
+        outputs = np.empty((len(X), self.output_size), dtype=np.float32)
+        for start in range(0, len(X), chunk_size):
+            outputs[start:start+chunk_size] = predictor.run(self.output, feed_dict={self.x: X[start:start+chunk_size]})
+        return outputs
 
-        with tf.Session() as sess:
-            sess.run(tf.global_variables_initializer())
-            for epoch in range(self.epoch):
-                avg_loss = 0.
-                avg_accuracy = 0.
-                self.learning_rate = utils.get_learning_rate(self.learning_rate_decay, self.initial_learning_rate, epoch)
-                for i in range(batches_per_epoch):
-                    batch_x, batch_y = utils.get_batch(X, Y, self.batch_size)
-                    sess.run(self.optimizer, feed_dict={self.x: batch_x, self.y: batch_y})
-                    loss, accuracy = sess.run([self.loss, self.accuracy], feed_dict={self.x: batch_x, self.y: batch_y})
-                    avg_loss += loss
-                    avg_accuracy += accuracy
-                avg_loss /= batches_per_epoch
-                avg_accuracy /= batches_per_epoch
-                print('epoch {0}: loss = {1:.6f}, accuracy = {2:.2f}%'.format(epoch, avg_loss, avg_accuracy * 100))
-            self.saver.save(sess, './weights/forward/' + self.scope_name + '/checkpoint', global_step=0)
-
-    def test(self, X, Y, samples_shown=1):
-        with tf.Session() as sess:
-            self.saver.restore(sess, tf.train.latest_checkpoint('./weights/forward/' + self.scope_name))
-            avg_loss, avg_accuracy = sess.run([self.loss, self.accuracy], feed_dict={self.x: X, self.y: Y})
-            print("Test: loss = {0:.6f}, accuracy = {1:.2f}%".format(avg_loss, avg_accuracy * 100))
\ No newline at end of file
+    def test(self, X, Y, samples_shown=1, chunk_size=65536):
+        predictor = self.get_predictor()
+        avg_loss = 0.
+        confusion = ConfusionMatrix(self.output_size)
+        for start in range(0, len(X), chunk_size):
+            batch_x, batch_y = utils.get_sequential_batch(X, Y, start, chunk_size)
+            loss, output = predictor.run([self.loss, self.output], feed_dict={self.x: batch_x, self.y: batch_y})
+            confusion.update_scores(batch_y, output)
+            avg_loss += loss * len(batch_x)
+        confusion.print()
+        avg_loss /= len(X)
+        metrics = confusion.metrics()
+        print("Test: loss = {0:.6f}, accuracy = {1:.2f}%".format(avg_loss, metrics['accuracy'] * 100))
+        return dict(metrics, loss=avg_loss)
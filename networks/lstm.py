@@ -1,7 +1,13 @@
 import numpy as np
 import tensorflow as tf
 from utils import Utils as utils
+from training import get_learning_rate
+import checkpoint
 from tensorflow.contrib import rnn
+from .predictor import Predictor
+from . import trainer
+from evaluation import ConfusionMatrix
+import runtime
 
 class Lstm:
     def assertions(self):
@@ -12,7 +18,8 @@ class Lstm:
 
     def __init__(self, max_sequence_length, input_size, state_size, output_size, loss_function, activation_function='tanh',
                 initialization_function='uniform', optimization_function='gradient-descent', epoch=1000, learning_rate=0.01, 
-                learning_rate_decay='none', noise='none', batch_size=16, cost_mask=np.array([]), scope_name='default'):
+                learning_rate_decay='none', noise='none', batch_size=16, cost_mask=np.array([]), scope_name='default', prefetch=4, bucketing=False, patience=0, weights_path=None, log_path=None, trace_steps=[],
+                checkpoint_steps=0, checkpoint_minutes=0, checkpoint_keep=3):
         self.max_sequence_length = max_sequence_length
         self.input_size = input_size
         self.state_size = state_size
@@ -24,86 +31,138 @@ class Lstm:
         self.epoch = epoch
         self.learning_rate = learning_rate
         self.learning_rate_decay = learning_rate_decay
-        self.initial_learning_rate = utils.get_learning_rate(self.learning_rate_decay, self.learning_rate, 0)
+        self.initial_learning_rate = get_learning_rate(self.learning_rate_decay, self.learning_rate, 0)
+        self.patience = patience
         self.noise = noise
         self.batch_size = batch_size
         self.scope_name = scope_name
+        self.prefetch = prefetch
+        self.bucketing = bucketing
+        self.weights_path = weights_path if weights_path is not None else './weights/lstm/' + self.scope_name
+        self.log_path = log_path if log_path is not None else './logs/lstm/' + self.scope_name
+        self.trace_steps = trace_steps
+        self.checkpoint_steps = checkpoint_steps
+        self.checkpoint_minutes = checkpoint_minutes
+        self.checkpoint_keep = checkpoint_keep
+        self.predictor = None
+        self.forget_bias = 1.0
         if(not len(cost_mask) > 0 or not self.output_size > 0): #TODO handle output_size <= 0
             cost_mask = np.ones(self.output_size)        
-        self.cost_mask = tf.reshape(tf.constant(np.tile(cost_mask, batch_size * max_sequence_length), dtype=tf.float32), (batch_size, max_sequence_length, output_size))
+        self.cost_mask = np.asarray(cost_mask, dtype=np.float32)
+        self.graph = tf.Graph()
         self.assertions()
         self._create_model()
 
     def _create_model(self):
-        with tf.variable_scope(self.scope_name) as scope:
-            self.x = tf.placeholder(tf.float32, [self.batch_size, self.max_sequence_length, self.input_size]) #batch - timeseries - input vector
-            self.y = tf.placeholder(tf.float32, [self.batch_size, self.max_sequence_length, self.output_size]) #batch - timeseries - class vector
-            self.sequence_length = tf.placeholder(tf.int32, [self.batch_size])
+        with self.graph.as_default(), tf.variable_scope(self.scope_name) as scope:
+            self.x = tf.placeholder(tf.float32, [None, None, self.input_size]) #batch - timeseries - input vector
+            self.y = tf.placeholder(tf.float32, [None, None, self.output_size]) #batch - timeseries - class vector
+            self.sequence_length = tf.placeholder(tf.int32, [None])
+            self.learning_rate_tensor = tf.placeholder(tf.float32, [])
+            cost_mask = tf.constant(self.cost_mask, dtype=tf.float32) #broadcast over batch and timesteps
             initializer = utils.get_initializater(self.initialization_function)
             activation = utils.get_activation(self.activation_function)
         
-            cell = tf.nn.rnn_cell.LSTMCell(num_units=self.state_size, num_proj=self.output_size, initializer=initializer, activation=activation) #TODO check if all the gates are present
+            cell = tf.nn.rnn_cell.LSTMCell(num_units=self.state_size, num_proj=self.output_size, initializer=initializer, activation=activation, forget_bias=self.forget_bias) #TODO check if all the gates are present
 
             outputs, _ = tf.nn.dynamic_rnn(cell=cell, inputs=self.x, sequence_length=self.sequence_length, dtype=tf.float32)
+            self.cell_variables = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope=scope.name + '/rnn/') #kernel, bias and projection
+            self.output = outputs
 
-            self.loss = utils.get_loss(logits=outputs, labels=self.y, name=self.loss_function, lengths=self.sequence_length, cost_mask=self.cost_mask)
-            self.optimizer = utils.get_optimizer(name=self.optimization_function, learning_rate=self.learning_rate).minimize(self.loss)
+            self.loss = utils.get_loss(logits=outputs, labels=self.y, name=self.loss_function, lengths=self.sequence_length, cost_mask=cost_mask)
+            self.optimizer = utils.get_optimizer(name=self.optimization_function, learning_rate=self.learning_rate_tensor).minimize(self.loss)
 
-            correct_prediction = tf.equal(tf.argmax(outputs, 2), tf.argmax(self.y, 2))
-            self.accuracy = tf.reduce_mean(tf.cast(correct_prediction, tf.float32))
+            correct_prediction = tf.cast(tf.equal(tf.argmax(outputs, 2), tf.argmax(self.y, 2)), tf.float32)
+            steps_mask = tf.sequence_mask(self.sequence_length, tf.shape(self.x)[1], dtype=tf.float32) #padded timesteps are not predictions
+            self.accuracy = tf.reduce_sum(correct_prediction * steps_mask) / tf.maximum(tf.reduce_sum(steps_mask), 1.)
 
-            #Test
-            self.testLogits = tf.reshape(outputs, (-1, self.output_size))
-            self.testLabels = tf.reshape(self.y, (-1, self.output_size))
+            #Metrics
+            [self.avg_loss, self.avg_accuracy], metrics_update, self.metrics_reset = utils.get_running_means([self.loss, self.accuracy], 'metrics', [self.optimizer]) #the values come from the forward pass the step used, added once the step is done
+            self.train_step = tf.group(self.optimizer, metrics_update)
 
-            #Saver
-            self.saver = tf.train.Saver()
-        
-            #Tensorboard
-            #writer = tf.summary.FileWriter("C:\\Users\\danie\\Documents\\SDA-LSTM\\logs", graph=tf.get_default_graph())
-    
-    def train(self, X, Y, lengths):
-        batches_per_epoch = int(len(X) / self.batch_size)
-
-        with tf.Session() as sess:
-            sess.run(tf.global_variables_initializer())
-            for epoch in range(self.epoch):
-                avg_loss = 0.
-                avg_accuracy = 0.
-                self.learning_rate = utils.get_learning_rate(self.learning_rate_decay, self.initial_learning_rate, epoch)
-                for i in range(batches_per_epoch):
-                    batch_x, batch_y, batch_length = utils.get_rnn_sequential_batch(X, Y, lengths, i * self.batch_size, self.batch_size)
-                    batch_x = utils.add_noise(batch_x, self.noise)
-                    sess.run(self.optimizer, feed_dict={self.x: batch_x, self.y: batch_y, self.sequence_length: batch_length})
-                    loss, accuracy = sess.run([self.loss, self.accuracy], feed_dict={self.x: batch_x, self.y: batch_y, self.sequence_length: batch_length})
-                    avg_loss += loss
-                    avg_accuracy += accuracy
-                avg_loss /= batches_per_epoch
-                avg_accuracy /= batches_per_epoch
-                print("Epoch {0}: loss = {1:.6f}, accuracy = {2:.2f}%".format(epoch, avg_loss, avg_accuracy * 100))
-            self.saver.save(sess, './weights/lstm/' + self.scope_name + '/checkpoint', global_step=0)
+            #Saver and initializer of this model only, its graph holds nothing else
+            self.variables = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope=scope.name + '/') #weights and optimizer state
+            self.saver = tf.train.Saver(var_list=self.variables)
+            self.initializer = tf.variables_initializer(tf.global_variables())
+            
+    def _batch_indexes(self, lengths, bucketing=False):
+        if bucketing:
+            return utils.get_rnn_bucketed_batches(lengths, self.batch_size)
+        return [slice(start, start + self.batch_size) for start in range(0, len(lengths), self.batch_size)]
+
+    def _batches(self, X, Y, lengths, noise='none', noise_buffer=None, bucketing=False):
+        for idx in self._batch_indexes(lengths, bucketing):
+            batch_x, batch_y, batch_length = utils.get_rnn_indexed_batch(X, Y, lengths, idx)
+            out = None
+            if noise_buffer is not None:
+                out = np.reshape(noise_buffer[:batch_x.size], batch_x.shape)
+            yield utils.add_noise(batch_x, noise, out=out), batch_y, batch_length
+
+    def _validation_loss(self, sess, X, Y, lengths):
+        total_loss = 0.
+        for batch_x, batch_y, batch_length in self._batches(X, Y, lengths):
+            total_loss += sess.run(self.loss, feed_dict={self.x: batch_x, self.y: batch_y, self.sequence_length: batch_length}) * len(batch_x)
+        return total_loss / len(X)
+
+    def train(self, X, Y, lengths, validation=None, resume=False):
+        noise_buffer = None
+        if self.prefetch <= 0: #queued batches cannot share a buffer
+            noise_buffer = np.empty(self.batch_size * np.prod(X.shape[1:]), dtype=np.float32)
+        validation_loss = None
+        if validation is not None:
+            validation_loss = lambda sess: self._validation_loss(sess, validation[0], validation[1], validation[2])
+        checkpointer = self._checkpointer()
+
+        with utils.get_session(self.graph) as sess:
+            sess.run(self.initializer)
+            state = checkpointer.restore(sess) if resume else None
+            if state is None:
+                checkpointer.clear()
+            best_loss = trainer.fit(self, sess, lambda: self._batches(X, Y, lengths, self.noise, noise_buffer, self.bucketing), [self.x, self.y, self.sequence_length],
+                                    self.train_step, {'loss': self.avg_loss, 'accuracy': self.avg_accuracy}, self.metrics_reset, validation_loss, self.epoch, checkpointer, state)
+            checkpointer.close()
+            if validation is None:
+                self.saver.save(sess, self.weights_path + '/checkpoint', global_step=0)
+        return best_loss
     
+    def _checkpointer(self, name='periodic'):
+        return checkpoint.Checkpointer(self.weights_path + '/' + name, self.variables, self.checkpoint_steps, self.checkpoint_minutes, self.checkpoint_keep)
+
+    def get_predictor(self):
+        if self.predictor is None:
+            self.predictor = Predictor(self.saver, self.weights_path, self.graph)
+        return self.predictor
+
+    def export(self, path):
+        values = self.get_predictor().run(self.cell_variables, feed_dict={})
+        arrays = {}
+        for variable, value in zip(self.cell_variables, values):
+            if 'projection' in variable.name:
+                arrays['projection'] = value
+            else:
+                arrays['kernel' if value.ndim == 2 else 'bias'] = value
+        runtime.save(path, 'lstm', {'activation_function': self.activation_function, 'forget_bias': self.forget_bias,
+                    'max_sequence_length': self.max_sequence_length}, arrays)
+
+    def predict(self, X, lengths):
+        predictor = self.get_predictor()
+        outputs = np.zeros((len(X), X.shape[1], self.output_size), dtype=np.float32)
+        for start in range(0, len(X), self.batch_size):
+            batch_x, _, batch_length = utils.get_rnn_indexed_batch(X, X, lengths, slice(start, start + self.batch_size))
+            outputs[start:start+len(batch_x), :batch_x.shape[1]] = predictor.run(self.output, feed_dict={self.x: batch_x, self.sequence_length: batch_length})
+        return outputs
+
     def test(self, X, Y, lengths):
-        batches_per_epoch = int(len(X) / self.batch_size)
-
-        with tf.Session() as sess:
-            self.saver.restore(sess, tf.train.latest_checkpoint('./weights/lstm/' + self.scope_name))
-            avg_accuracy = 0.
-            avg_loss = 0.
-            counters = [[0 for i in range(self.output_size)] for j in range(self.output_size)]
-            for i in range(batches_per_epoch):
-                batch_x, batch_y, batch_length = utils.get_rnn_sequential_batch(X, Y, lengths, i * self.batch_size, self.batch_size)  
-                loss, accuracy, testLogits, testLabels = sess.run([self.loss, self.accuracy, self.testLogits, self.testLabels], feed_dict={self.x: batch_x, self.y: batch_y, self.sequence_length: batch_length})            
-                
-                for i in range(len(testLabels)):
-                        label_idx = np.argmax(testLabels[i])
-                        logit_idx = np.argmax(testLogits[i])
-                        counters[label_idx][logit_idx] += 1
-                
-                avg_loss += loss
-                avg_accuracy += accuracy
-            [print("class {0}, accuracy = {1:.2f}, values =".format(i+1, counters[i][i] / np.sum(counters[i])), counters[i]) for i in range(len(counters))]
-            avg_loss /= batches_per_epoch
-            avg_accuracy /= batches_per_epoch
-            print("Test: loss = {0:.6f}, accuracy = {1:.2f}%".format(avg_loss, avg_accuracy * 100))
+        predictor = self.get_predictor()
+        avg_loss = 0.
+        confusion = ConfusionMatrix(self.output_size)
+        for batch_x, batch_y, batch_length in self._batches(X, Y, lengths):
+            loss, output = predictor.run([self.loss, self.output], feed_dict={self.x: batch_x, self.y: batch_y, self.sequence_length: batch_length})
+            confusion.update_scores(batch_y, output, mask=np.arange(batch_y.shape[1]) < batch_length[:, None]) #padded timesteps are not predictions
+            avg_loss += loss * len(batch_x)
+        confusion.print()
+        avg_loss /= len(X)
+        metrics = confusion.metrics()
+        print("Test: loss = {0:.6f}, accuracy = {1:.2f}%".format(avg_loss, metrics['accuracy'] * 100))
+        return dict(metrics, loss=avg_loss)
 
@@ -0,0 +1,27 @@
+import tensorflow as tf
+from utils import Utils as utils
+
+class Predictor:
+
+    def __init__(self, saver, weights_path, graph=None):
+        self.saver = saver
+        self.weights_path = weights_path
+        self.session = utils.get_session(graph)
+        self.checkpoint = None
+        self.index = None
+
+    def refresh(self):
+        checkpoint = tf.train.latest_checkpoint(self.weights_path)
+        assert checkpoint is not None, "No checkpoint found in " + self.weights_path
+        with open(checkpoint + '.index', 'rb') as f: #checksums of the saved tensors, two saves within the mtime resolution still differ
+            index = f.read()
+        if checkpoint != self.checkpoint or index != self.index: #restore only when a newer checkpoint has been saved
+            self.saver.restore(self.session, checkpoint)
+            self.checkpoint, self.index = checkpoint, index
+
+    def run(self, fetches, feed_dict):
+        self.refresh()
+        return self.session.run(fetches, feed_dict=feed_dict)
+
+    def close(self):
+        self.session.close()
@@ -1,6 +1,13 @@
 import tensorflow as tf
 import numpy as np
+import os
 from utils import Utils as utils
+from training import get_learning_rate
+import checkpoint
+from .predictor import Predictor
+from . import trainer
+from evaluation import ConfusionMatrix
+import runtime
 
 class StackedAutoEncoder:
     
@@ -14,12 +21,14 @@ class StackedAutoEncoder:
         assert utils.noise_validator(self.noise) == True, "Invalid noises."
 
     def __init__(self, input_size, dims, encoding_functions, decoding_functions, loss_functions, optimization_function, noise, epoch=1000,
-                 learning_rate=0.001, learning_rate_decay='none', batch_size=100, scope_name='default'):
+                 learning_rate=0.001, learning_rate_decay='none', batch_size=100, scope_name='default', prefetch=4, patience=0, weights_path=None, log_path=None, trace_steps=[],
+                 checkpoint_steps=0, checkpoint_minutes=0, checkpoint_keep=3, spill_path=None):
         self.input_size = input_size
         self.batch_size = batch_size
         self.learning_rate = learning_rate
         self.learning_rate_decay = learning_rate_decay
-        self.initial_learning_rate = utils.get_learning_rate(self.learning_rate_decay, self.learning_rate, 0)
+        self.initial_learning_rate = get_learning_rate(self.learning_rate_decay, self.learning_rate, 0)
+        self.patience = patience
         self.loss_functions = loss_functions
         self.optimization_function = optimization_function
         self.encoding_functions = encoding_functions
@@ -29,18 +38,29 @@ class StackedAutoEncoder:
         self.dims = dims
         self.depth = len(dims)
         self.scope_name = scope_name
+        self.prefetch = prefetch
+        self.weights_path = weights_path if weights_path is not None else './weights/sdae/' + self.scope_name
+        self.log_path = log_path if log_path is not None else './logs/sdae/' + self.scope_name
+        self.trace_steps = trace_steps
+        self.checkpoint_steps = checkpoint_steps
+        self.checkpoint_minutes = checkpoint_minutes
+        self.checkpoint_keep = checkpoint_keep
+        self.spill_path = spill_path
+        self.predictor = None
         self.weights, self.biases, self.decoding_biases = [], [], []
+        self.graph = tf.Graph()
         self.assertions()
         self._create_model()
         
     def _create_model(self):
-        with tf.variable_scope(self.scope_name) as scope:
+        with self.graph.as_default(), tf.variable_scope(self.scope_name) as scope:
             self.x = []
             for i in range(self.depth):
                 if(i == 0):
                     self.x.append(tf.placeholder(tf.float32, [None, self.input_size]))
                 else:
                     self.x.append(tf.placeholder(tf.float32, [None, self.dims[i - 1]]))
+            self.learning_rate_tensor = tf.placeholder(tf.float32, [])
             
             self.weights, self.biases = [], [] #ENC1, ENC2, ENC3, DEC3, DEC2, DEC1
             self.layerwise_encoded = [] #ENC1(X), ENC2(X), ENC3(X)
@@ -91,87 +111,193 @@ class StackedAutoEncoder:
             self.encoded_data = self.encoded[self.depth - 1]
             self.decoded_data = self.decoded[self.depth - 1]
 
+            #Training: the inputs are corrupted in the graph, with a new noise for every batch
+            self.layerwise_noisy_decoded = [] #DEC1(ENC1(NOISE1(X))), DEC2(ENC2(NOISE2(X))), DEC3(ENC3(NOISE3(X)))
+            for i in range(self.depth):
+                encoding_function = utils.get_activation(self.encoding_functions[i])
+                decoding_function = utils.get_activation(self.decoding_functions[i])
+                noisy_encoded = encoding_function(tf.matmul(utils.get_noise(self.x[i], self.noise[i]), self.weights[i]) + self.biases[i])
+                self.layerwise_noisy_decoded.append(decoding_function(tf.matmul(noisy_encoded, self.weights[2 * self.depth - 1 - i]) + self.biases[2 * self.depth - 1 - i]))
+
+            noisy_decoded = utils.get_noise(self.x[0], self.noise[0])
+            for i in range(self.depth):
+                noisy_decoded = utils.get_activation(self.encoding_functions[i])(tf.matmul(noisy_decoded, self.weights[i]) + self.biases[i])
+            for i in range(self.depth - 1, -1, -1):
+                noisy_decoded = utils.get_activation(self.decoding_functions[i])(tf.matmul(noisy_decoded, self.weights[2 * self.depth - 1 - i]) + self.biases[2 * self.depth - 1 - i])
+
             self.layerwise_losses = []
+            self.layerwise_reconstruction_losses = []
             self.layerwise_optimizers = []
+            self.layerwise_avg_losses = []
+            self.layerwise_train_steps = []
+            self.layerwise_metrics_resets = []
             for i in range(self.depth):
-                loss = utils.get_loss(logits=self.layerwise_decoded[self.depth - 1 - i], labels=self.x[i], name=self.loss_functions[i])
-                optimizer = utils.get_optimizer(name=self.optimization_function, learning_rate=self.learning_rate).minimize(loss)
+                loss = utils.get_loss(logits=self.layerwise_noisy_decoded[i], labels=self.x[i], name=self.loss_functions[i]) #the clean input is reconstructed
+                self.layerwise_reconstruction_losses.append(utils.get_loss(logits=self.layerwise_decoded[self.depth - 1 - i], labels=self.x[i], name=self.loss_functions[i]))
+                optimizer = utils.get_optimizer(name=self.optimization_function, learning_rate=self.learning_rate_tensor).minimize(loss)
+                [avg_loss], metrics_update, metrics_reset = utils.get_running_means([loss], 'layer_{0}_metrics'.format(i), [optimizer]) #the values come from the forward pass the step used, added once the step is done
                 self.layerwise_losses.append(loss)
                 self.layerwise_optimizers.append(optimizer)
+                self.layerwise_avg_losses.append(avg_loss)
+                self.layerwise_train_steps.append(tf.group(optimizer, metrics_update))
+                self.layerwise_metrics_resets.append(metrics_reset)
 
-            self.finetuning_loss = utils.get_loss(labels=self.decoded_data, logits=self.x[0], name=self.loss_functions[0])
-            self.finetuning_optimizer = utils.get_optimizer(name=self.optimization_function, learning_rate=self.learning_rate).minimize(self.finetuning_loss)
+            self.finetuning_loss = utils.get_loss(labels=noisy_decoded, logits=self.x[0], name=self.loss_functions[0])
+            self.reconstruction_loss = utils.get_loss(labels=self.decoded_data, logits=self.x[0], name=self.loss_functions[0])
+            self.finetuning_optimizer = utils.get_optimizer(name=self.optimization_function, learning_rate=self.learning_rate_tensor).minimize(self.finetuning_loss)
+            [self.finetuning_avg_loss], metrics_update, self.finetuning_metrics_reset = utils.get_running_means([self.finetuning_loss], 'finetuning_metrics', [self.finetuning_optimizer])
+            self.finetuning_train_step = tf.group(self.finetuning_optimizer, metrics_update)
 
-            #Saver
-            self.saver = tf.train.Saver()
+            #Saver and initializer of this model only, its graph holds nothing else
+            self.variables = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope=scope.name + '/') #weights and optimizer state
+            self.saver = tf.train.Saver(var_list=self.variables)
+            self.initializer = tf.variables_initializer(tf.global_variables())
             
-            #Tensorboard
-            #writer = tf.summary.FileWriter("C:\\Users\\danie\\Documents\\SDA-LSTM\\logs", graph=tf.get_default_graph())
+    def _batches(self, X, batches_per_epoch):
+        for i in range(batches_per_epoch):
+            yield (np.asarray(X[np.random.choice(len(X), self.batch_size, replace=False)]),)
 
-    def train(self, X):
+    def _validation_loss(self, sess, loss, x, X):
+        total_loss = 0.
+        for start in range(0, len(X), self.batch_size):
+            batch_x = X[start:start+self.batch_size]
+            total_loss += sess.run(loss, feed_dict={x: batch_x}) * len(batch_x)
+        return total_loss / len(X)
+
+    def _fit(self, sess, X, validation, x, train_step, avg_loss, metrics_reset, loss, epochs, phase, checkpointer, state=None, phase_state={}):
         batches_per_epoch = int(len(X) / self.batch_size)
+        validation_loss = None
+        if validation is not None:
+            validation_loss = lambda sess: self._validation_loss(sess, loss, x, validation)
+        best_loss = trainer.fit(self, sess, lambda: self._batches(X, batches_per_epoch), [x], train_step, {'loss': avg_loss}, metrics_reset,
+                                validation_loss, epochs, checkpointer, state, phase, phase_state)
+        if validation is not None:
+            self.saver.restore(sess, tf.train.latest_checkpoint(self.weights_path))
+        return best_loss
+
+    def _spill(self, name, layer):
+        if self.spill_path is None:
+            return None
+        os.makedirs(self.spill_path, exist_ok=True)
+        return os.path.join(self.spill_path, '{0}-layer-{1}.npy'.format(name, layer + 1))
 
-        with tf.Session() as sess:
-            sess.run(tf.global_variables_initializer())
+    def _encode_layer(self, sess, layer, X, chunk_size=65536, output_path=None): #input of the next layer, computed chunk by chunk
+        shape = (len(X), self.dims[layer])
+        if output_path is None:
+            result = np.empty(shape, dtype=np.float32)
+        else:
+            result = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.float32, shape=shape)
+        for start in range(0, len(X), chunk_size):
+            result[start:start+chunk_size] = sess.run(self.layerwise_encoded[layer], feed_dict={self.x[layer]: X[start:start+chunk_size]})
+        if output_path is not None:
+            result.flush()
+        return result
+
+    def train(self, X, validation=None, resume=False, chunk_size=65536):
+        checkpointer = self._checkpointer()
+        loss = None
+        with utils.get_session(self.graph) as sess:
+            sess.run(self.initializer)
+            state = checkpointer.restore(sess) if resume else None
+            if state is None:
+                checkpointer.clear()
+                state = {'layer': 0}
             for layer in range(self.depth):
-                print('Layer {0}'.format(layer + 1))
-                tmp = np.copy(X)
-                tmp = utils.add_noise(tmp, self.noise[layer])
-                X = tmp
-                for epoch in range(self.epoch[layer]):
-                    avg_loss = 0.
-                    self.learning_rate = utils.get_learning_rate(self.learning_rate_decay, self.initial_learning_rate, epoch)
-                    for i in range(batches_per_epoch):
-                        batch_x, batch_y = utils.get_batch(X, X, self.batch_size)
-                        sess.run(self.layerwise_optimizers[layer], feed_dict={self.x[layer]: batch_x})
-                        loss = sess.run(self.layerwise_losses[layer], feed_dict={self.x[layer]: batch_x})
-                        avg_loss += loss
-                    avg_loss /= batches_per_epoch
-                    print("Epoch {0}: loss = {1:.6f}".format(epoch, avg_loss))
-                X = sess.run(self.layerwise_encoded[layer], feed_dict={self.x[layer]: X})
-            self.saver.save(sess, './weights/sdae/' + self.scope_name + '/checkpoint', global_step=0)
-
-    def finetune(self, X):
+                if layer >= state['layer']: #the layers already trained are only encoded
+                    print('Layer {0}'.format(layer + 1))
+                    loss = self._fit(sess, X, validation, self.x[layer], self.layerwise_train_steps[layer], self.layerwise_avg_losses[layer],
+                            self.layerwise_metrics_resets[layer], self.layerwise_reconstruction_losses[layer], self.epoch[layer], 'layer-{0}'.format(layer + 1),
+                            checkpointer, state if layer == state['layer'] else None, {'layer': layer})
+                if layer < self.depth - 1:
+                    X = self._encode_layer(sess, layer, X, chunk_size, self._spill('train', layer))
+                    if validation is not None:
+                        validation = self._encode_layer(sess, layer, validation, chunk_size, self._spill('validation', layer))
+            checkpointer.close()
+            self.saver.save(sess, self.weights_path + '/checkpoint', global_step=0)
+        return loss #of the deepest layer
+
+    def finetune(self, X, validation=None, resume=False):
         print('Fine Tuning')
-        batches_per_epoch = int(len(X) / self.batch_size)
-        with tf.Session() as sess:
-            self.saver.restore(sess, tf.train.latest_checkpoint('./weights/sdae/' + self.scope_name))
-            tmp = np.copy(X)
-            tmp = utils.add_noise(tmp, self.noise[0])
-            X = tmp
-            for epoch in range(self.epoch[0]):
-                avg_loss = 0.
-                self.learning_rate = utils.get_learning_rate(self.learning_rate_decay, self.initial_learning_rate, epoch)
-                for i in range(batches_per_epoch):
-                    batch_x, batch_y = utils.get_batch(X, X, self.batch_size)
-                    sess.run(self.finetuning_optimizer, feed_dict={self.x[0]: batch_x})
-                    loss = sess.run(self.finetuning_loss, feed_dict={self.x[0]: batch_x})
-                    avg_loss += loss
-                avg_loss /= batches_per_epoch
-                print('epoch {0}: loss = {1:.6f}'.format(epoch, avg_loss))
-            self.saver.save(sess, './weights/sdae/' + self.scope_name + '/checkpoint', global_step=0)
-
-    def encode(self, data):
-        with tf.Session() as sess:
-            self.saver.restore(sess, tf.train.latest_checkpoint('./weights/sdae/' + self.scope_name))
-            return sess.run(self.encoded_data, feed_dict={self.x[0]: data})
-
-    def timeseries_encode(self, data):
-        with tf.Session() as sess:
-            self.saver.restore(sess, tf.train.latest_checkpoint('./weights/sdae/' + self.scope_name))
-            result = []
-            for sequence in data:
-                encoded_sequence = sess.run(self.encoded_data, feed_dict={self.x[0]: sequence})
-                result.append(encoded_sequence)
-            return result
-
-    def test(self, data, samples_shown=1, threshold=0.0):
-        with tf.Session() as sess:
-            self.saver.restore(sess, tf.train.latest_checkpoint('./weights/sdae/' + self.scope_name))
-            avg_loss, decoded_data = sess.run([self.finetuning_loss, self.decoded_data], feed_dict={self.x[0]: data})
-            for i in np.random.choice(len(data), samples_shown):
+        checkpointer = self._checkpointer('periodic-finetuning')
+        with utils.get_session(self.graph) as sess:
+            self.saver.restore(sess, tf.train.latest_checkpoint(self.weights_path))
+            state = checkpointer.restore(sess) if resume else None
+            if state is None:
+                checkpointer.clear()
+            loss = self._fit(sess, X, validation, self.x[0], self.finetuning_train_step, self.finetuning_avg_loss,
+                    self.finetuning_metrics_reset, self.reconstruction_loss, self.epoch[0], 'finetuning', checkpointer, state)
+            checkpointer.close()
+            self.saver.save(sess, self.weights_path + '/checkpoint', global_step=0)
+        return loss
+
+    def _checkpointer(self, name='periodic'):
+        return checkpoint.Checkpointer(self.weights_path + '/' + name, self.variables, self.checkpoint_steps, self.checkpoint_minutes, self.checkpoint_keep)
+
+    def get_predictor(self):
+        if self.predictor is None:
+            self.predictor = Predictor(self.saver, self.weights_path, self.graph)
+        return self.predictor
+
+    def export(self, path): #the encoder only
+        weights, biases = self.get_predictor().run([self.weights[:self.depth], self.biases[:self.depth]], feed_dict={})
+        arrays = {}
+        for i in range(self.depth):
+            arrays['weights_{0}'.format(i)], arrays['biases_{0}'.format(i)] = weights[i], biases[i]
+        runtime.save(path, 'sdae', {'activation_functions': self.encoding_functions}, arrays)
+
+    def encode(self, data, chunk_size=65536, output_path=None):
+        predictor = self.get_predictor()
+        shape = (len(data), self.dims[-1])
+        if output_path is None:
+            result = np.empty(shape, dtype=np.float32)
+        else:
+            result = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.float32, shape=shape)
+        for start in range(0, len(data), chunk_size):
+            result[start:start+chunk_size] = predictor.run(self.encoded_data, feed_dict={self.x[0]: data[start:start+chunk_size]})
+        if output_path is not None:
+            result.flush()
+        return result
+
+    def timeseries_encode(self, data, chunk_size=65536, output_path=None):
+        predictor = self.get_predictor()
+        shape = (len(data), data.shape[1], self.dims[-1])
+        if output_path is None:
+            result = np.empty(shape, dtype=np.float32)
+        else:
+            result = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.float32, shape=shape)
+        people = max(1, chunk_size // data.shape[1]) #people per chunk, so that each run encodes about chunk_size waves
+        for start in range(0, len(data), people):
+            chunk = np.reshape(data[start:start+people], (-1, data.shape[2]))
+            encoded_chunk = predictor.run(self.encoded_data, feed_dict={self.x[0]: chunk})
+            result[start:start+people] = np.reshape(encoded_chunk, (-1, shape[1], shape[2]))
+        if output_path is not None:
+            result.flush()
+        return result
+
+    def test(self, data, samples_shown=1, threshold=0.0, classes_num=0, chunk_size=65536): #the last classes_num columns are one-hot classes
+        predictor = self.get_predictor()
+        avg_loss = 0.
+        confusion = ConfusionMatrix(classes_num) if classes_num > 0 else None
+        for start in range(0, len(data), chunk_size):
+            batch = np.asarray(data[start:start+chunk_size])
+            loss, decoded_data = predictor.run([self.reconstruction_loss, self.decoded_data], feed_dict={self.x[0]: batch})
+            if confusion is not None: #classes recovered from the reconstruction
+                confusion.update_scores(batch[:, -classes_num:], decoded_data[:, -classes_num:])
+            avg_loss += loss * len(batch)
+        avg_loss /= len(data)
+        if samples_shown > 0:
+            samples = np.random.choice(len(data), samples_shown)
+            samples_data = np.asarray(data[samples])
+            samples_decoded = predictor.run(self.decoded_data, feed_dict={self.x[0]: samples_data})
+            for i, original, decoded in zip(samples, samples_data, samples_decoded):
                 print('Sample {0}'.format(i))
-                for d, d_ in zip(data[i], decoded_data[i]):
+                for d, d_ in zip(original, decoded):
                     if(abs(d-d_) >= threshold):
                         print('\tOriginal: {0:.2f} --- Reconstructed: {1:.2f} --- Difference: {2:.2f}'.format(d,d_,d-d_))
-            print("Test: loss = {0:.6f}".format(avg_loss))
\ No newline at end of file
+        if confusion is None:
+            print("Test: loss = {0:.6f}".format(avg_loss))
+            return {'loss': avg_loss}
+        confusion.print()
+        metrics = confusion.metrics()
+        print("Test: loss = {0:.6f}, class accuracy = {1:.2f}%".format(avg_loss, metrics['accuracy'] * 100))
+        return dict(metrics, loss=avg_loss)
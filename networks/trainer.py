@@ -0,0 +1,43 @@
+import itertools
+from pipeline import Prefetcher
+from training import TrainingController
+from instrumentation import Monitor
+import checkpoint
+
+#The epoch loop of every network: prefetched batches, running metrics, periodic checkpoints, validation and early stopping.
+#batches() yields tuples fed to the inputs placeholders, metrics maps the names printed and logged to their running means.
+def fit(network, sess, batches, inputs, train_step, metrics, metrics_reset, validation_loss, epochs, checkpointer, state=None, phase='train', phase_state={}):
+    controller = TrainingController(network.initial_learning_rate, network.learning_rate_decay, network.patience)
+    first_epoch, position = checkpoint.resume(state, controller)
+    monitor = Monitor(network.log_path, sess.graph, network.trace_steps, phase)
+    names = list(metrics)
+    for epoch in range(first_epoch, epochs):
+        sess.run(metrics_reset)
+        network.learning_rate = controller.get_learning_rate(epoch)
+        random_state = checkpoint.get_random_state()
+        for batch in monitor.batches(Prefetcher(itertools.islice(batches(), position, None), network.prefetch)): #batches already trained on are skipped
+            feed_dict = dict(zip(inputs, batch))
+            feed_dict[network.learning_rate_tensor] = network.learning_rate
+            monitor.run(sess, train_step, feed_dict, len(batch[0]))
+            position += 1
+            checkpointer.step(sess, lambda: dict(phase_state, epoch=epoch, position=position, random_state=random_state, controller=controller.__dict__))
+        position = 0
+        values = dict(zip(names, sess.run([metrics[name] for name in names])))
+        message = "Epoch {0}: loss = {1:.6f}".format(epoch, values['loss'])
+        if 'accuracy' in values:
+            message += ", accuracy = {0:.2f}%".format(values['accuracy'] * 100)
+        if validation_loss is None:
+            print(message)
+            stop = controller.update(values['loss'])
+        else:
+            values['validation_loss'] = validation_loss(sess)
+            print(message + ", validation loss = {0:.6f}".format(values['validation_loss']))
+            stop = controller.update(values['validation_loss'])
+            if controller.improved: #keep the best checkpoint on the held-out set
+                network.saver.save(sess, network.weights_path + '/checkpoint', global_step=0)
+        monitor.epoch(epoch, learning_rate=network.learning_rate, **values)
+        if stop:
+            print("Early stopping at epoch {0}".format(epoch))
+            break
+    monitor.close()
+    return controller.best_loss
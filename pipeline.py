@@ -0,0 +1,51 @@
+import threading
+import queue
+
+class Prefetcher:
+
+    def __init__(self, batches, capacity=4):
+        self.batches = batches
+        self.capacity = capacity
+
+    def __iter__(self):
+        if self.capacity <= 0:
+            for batch in self.batches:
+                yield batch
+            return
+
+        buffer = queue.Queue(self.capacity)
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for batch in self.batches:
+                    if not put((batch, None)):
+                        return
+            except BaseException as e:
+                put((end, e))
+                return
+            put((end, None))
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                batch, error = buffer.get()
+                if error is not None:
+                    raise error
+                if batch is end:
+                    return
+                yield batch
+        finally: #unblock the producer when the consumer stops early
+            stop.set()
+            producer.join()
@@ -0,0 +1,60 @@
+#Accuracy of the int8 feed-forward models against the float32 ones they were quantized from
+import numpy as np
+import argparse
+import runtime
+import os
+from evaluation import ConfusionMatrix
+
+def predict(X, model, encoder=None):
+    if encoder is not None:
+        X = encoder.predict(X)
+    return model.predict(X)
+
+def compare(X, Y, model, quantized, encoder=None, quantized_encoder=None, chunk_size=65536):
+    confusions = [ConfusionMatrix(model.output_size), ConfusionMatrix(model.output_size)]
+    agreement, valid_num = 0, 0
+    max_error = 0.
+    for start in range(0, len(X), chunk_size):
+        x, y = np.asarray(X[start:start+chunk_size], dtype=np.float32), np.asarray(Y[start:start+chunk_size])
+        valid = np.sum(y, axis=1) > 0 #missing waves have no class to predict
+        x, y = x[valid], y[valid]
+        output = predict(x, model, encoder)
+        quantized_output = predict(x, quantized, quantized_encoder if quantized_encoder is not None else encoder)
+        confusions[0].update_scores(y, output)
+        confusions[1].update_scores(y, quantized_output)
+        agreement += np.sum(np.argmax(output, axis=1) == np.argmax(quantized_output, axis=1))
+        valid_num += len(y)
+        max_error = max(max_error, float(np.max(np.abs(output - quantized_output), initial=0)))
+    accuracy, quantized_accuracy = confusions[0].accuracy(), confusions[1].accuracy()
+    return {'accuracy': accuracy, 'quantized_accuracy': quantized_accuracy, 'accuracy_drop': accuracy - quantized_accuracy,
+            'f1': np.mean(confusions[0].f1()), 'quantized_f1': np.mean(confusions[1].f1()),
+            'agreement': agreement / max(valid_num, 1), 'max_error': max_error}
+
+def print_report(report, sizes={}):
+    for path, (size, quantized_size) in sizes.items():
+        print("{0}: {1} bytes -> {2} bytes".format(path, size, quantized_size))
+    print("float32: accuracy = {0:.2f}%, f1 = {1:.4f}".format(report['accuracy'] * 100, report['f1']))
+    print("int8:    accuracy = {0:.2f}%, f1 = {1:.4f}".format(report['quantized_accuracy'] * 100, report['quantized_f1']))
+    print("accuracy drop = {0:.2f}%, agreement = {1:.2f}%, max output error = {2:.6f}".format(report['accuracy_drop'] * 100, report['agreement'] * 100, report['max_error']))
+
+def quantized_path(path):
+    return os.path.splitext(path)[0] + '.int8.npz'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Quantize exported feed-forward models to int8 and report the accuracy drop.")
+    parser.add_argument('--model', required=True, help="exported classifier (.npz)")
+    parser.add_argument('--encoder', default=None, help="exported sdae the classifier was trained on")
+    parser.add_argument('--data', default='./data')
+    parser.add_argument('--prefix', default='t')
+    args = parser.parse_args()
+
+    import dataset
+    data = dataset.Dataset(args.data, args.prefix)
+    paths = [path for path in [args.model, args.encoder] if path is not None]
+    sizes = {}
+    for path in paths:
+        runtime.quantize(path, quantized_path(path))
+        sizes[path] = (os.path.getsize(path), os.path.getsize(quantized_path(path)))
+    encoders = [None, None] if args.encoder is None else [runtime.load(args.encoder), runtime.load(quantized_path(args.encoder))]
+    report = compare(data.flat_values, data.flat_classes, runtime.load(args.model), runtime.load(quantized_path(args.model)), encoders[0], encoders[1])
+    print_report(report, sizes)
@@ -0,0 +1,47 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+class Stage:
+
+    def __init__(self, name, function, dependencies=[]):
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+
+def _execute(function, intra_op_threads, inter_op_threads):
+    from utils import Utils as utils #tensorflow is imported in the worker process only
+    utils.set_session_threads(intra_op_threads, inter_op_threads)
+    return function()
+
+def run(stages, workers=None, intra_op_threads=None, inter_op_threads=2):
+    names = [stage.name for stage in stages]
+    assert len(set(names)) == len(names), "Stage names should be unique"
+    for stage in stages:
+        for dependency in stage.dependencies:
+            assert dependency in names, "Unknown dependency " + dependency + " of stage " + stage.name
+
+    cpus = os.cpu_count() or 1
+    if workers is None:
+        workers = min(len(stages), cpus)
+    if intra_op_threads is None: #split the cores among the concurrent sessions instead of oversubscribing them
+        intra_op_threads = max(1, cpus // workers)
+
+    results = {}
+    pending = list(stages)
+    running = {}
+    context = multiprocessing.get_context('spawn') #tensorflow is not fork safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        while pending or running:
+            ready = [stage for stage in pending if all(d in results for d in stage.dependencies)]
+            assert ready or running, "Circular dependencies between stages"
+            for stage in ready:
+                pending.remove(stage)
+                print("Starting stage {0}".format(stage.name))
+                running[executor.submit(_execute, stage.function, intra_op_threads, inter_op_threads)] = stage
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                results[stage.name] = future.result() #a failed stage stops the run
+                print("Finished stage {0}".format(stage.name))
+    return results
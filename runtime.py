@@ -0,0 +1,127 @@
+#Forward passes of the exported networks with numpy only, tensorflow is never imported
+import numpy as np
+import json
+
+def sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1) #same as 1 / (1 + exp(-x)) without overflows
+
+def softmax(x):
+    e = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return e / np.sum(e, axis=-1, keepdims=True)
+
+def softplus(x):
+    return np.logaddexp(0, x)
+
+def relu(x):
+    return np.maximum(x, 0)
+
+def linear(x):
+    return x
+
+activations = {'sigmoid': sigmoid, 'softmax': softmax, 'softplus': softplus, 'linear': linear, 'tanh': np.tanh, 'relu': relu}
+
+def get_activation(name): #the names of Utils.get_activation
+    if name not in activations:
+        raise BaseException("Invalid activation function.")
+    return activations[name]
+
+def save(path, kind, config, arrays):
+    arrays = {name: value if np.asarray(value).dtype == np.int8 else np.asarray(value, dtype=np.float32) for name, value in arrays.items()}
+    with open(path, 'wb') as f:
+        np.savez(f, __config__=np.array(json.dumps(dict(config, kind=kind))), **arrays)
+
+def read(path):
+    with np.load(path) as data:
+        config = json.loads(str(data['__config__']))
+        arrays = {name: data[name] for name in data.files if name != '__config__'}
+    return config, arrays
+
+def load(path):
+    config, arrays = read(path)
+    return models[config['kind']](config, arrays)
+
+def quantize_weights(weights): #symmetric, one scale per output column
+    scale = np.max(np.abs(weights), axis=0) / 127.
+    scale[scale == 0] = 1.
+    return np.round(weights / scale).astype(np.int8), scale.astype(np.float32)
+
+def quantize(path, destination): #post-training int8 weights of the feed-forward models
+    config, arrays = read(path)
+    if config['kind'] not in ('forward', 'sdae'):
+        raise BaseException("Only feed-forward models can be quantized.")
+    assert not config.get('quantized', False), "Model already quantized."
+    for i in range(len(config['activation_functions'])):
+        arrays['weights_{0}'.format(i)], arrays['scales_{0}'.format(i)] = quantize_weights(arrays['weights_{0}'.format(i)])
+    save(destination, config['kind'], dict(config, quantized=True), arrays)
+
+class Dense: #feed-forward classifier and sdae encoder
+    chunk_size = 65536
+
+    def __init__(self, config, arrays):
+        self.config = config
+        self.activation_functions = [get_activation(name) for name in config['activation_functions']]
+        self.weights = [arrays['weights_{0}'.format(i)] for i in range(len(self.activation_functions))]
+        self.biases = [arrays['biases_{0}'.format(i)] for i in range(len(self.activation_functions))]
+        self.scales = [arrays.get('scales_{0}'.format(i)) for i in range(len(self.activation_functions))] #None unless quantized
+        self.output_size = self.weights[-1].shape[1]
+
+    def _forward(self, x):
+        for weights, scales, biases, activation in zip(self.weights, self.scales, self.biases, self.activation_functions):
+            if scales is None:
+                x = activation(np.dot(x, weights) + biases)
+            else: #int8 weights are widened one layer at a time, the scales factor out of the product
+                x = activation(np.dot(x, weights.astype(np.float32)) * scales + biases)
+        return x
+
+    def predict(self, X):
+        result = np.empty((len(X), self.output_size), dtype=np.float32)
+        for start in range(0, len(X), self.chunk_size):
+            result[start:start+self.chunk_size] = self._forward(np.asarray(X[start:start+self.chunk_size], dtype=np.float32))
+        return result
+
+    def timeseries_predict(self, X): #every wave of every record
+        flat = self.predict(np.reshape(np.asarray(X, dtype=np.float32), (-1, X.shape[-1])))
+        return np.reshape(flat, X.shape[:-1] + (self.output_size,))
+
+class Lstm: #tf.nn.rnn_cell.LSTMCell with projection, unrolled as tf.nn.dynamic_rnn
+    chunk_size = 65536
+
+    def __init__(self, config, arrays):
+        self.config = config
+        self.activation = get_activation(config['activation_function'])
+        self.forget_bias = config['forget_bias']
+        self.kernel = arrays['kernel']
+        self.bias = arrays['bias']
+        self.projection = arrays['projection']
+        self.state_size = self.projection.shape[0]
+        self.output_size = self.projection.shape[1]
+        self.input_size = self.kernel.shape[0] - self.output_size
+        self.input_kernel = np.ascontiguousarray(self.kernel[:self.input_size]) #inputs and previous outputs are not concatenated
+        self.output_kernel = np.ascontiguousarray(self.kernel[self.input_size:])
+
+    def step(self, x, c, m):
+        gates = np.dot(x, self.input_kernel) + np.dot(m, self.output_kernel) + self.bias
+        i, j, f, o = np.split(gates, 4, axis=1)
+        c = sigmoid(f + self.forget_bias) * c + sigmoid(i) * self.activation(j)
+        m = np.dot(sigmoid(o) * self.activation(c), self.projection)
+        return c, m
+
+    def _forward(self, X, lengths):
+        outputs = np.zeros((len(X), X.shape[1], self.output_size), dtype=np.float32)
+        c = np.zeros((len(X), self.state_size), dtype=np.float32)
+        m = np.zeros((len(X), self.output_size), dtype=np.float32)
+        for t in range(min(X.shape[1], int(np.max(lengths, initial=0)))):
+            active = (lengths > t)[:, None] #finished sequences keep their state and output zeros
+            new_c, new_m = self.step(X[:, t], c, m)
+            c = np.where(active, new_c, c)
+            m = np.where(active, new_m, m)
+            outputs[:, t] = np.where(active, new_m, 0)
+        return outputs
+
+    def predict(self, X, lengths):
+        outputs = np.zeros((len(X), X.shape[1], self.output_size), dtype=np.float32)
+        for start in range(0, len(X), self.chunk_size):
+            outputs[start:start+self.chunk_size] = self._forward(np.asarray(X[start:start+self.chunk_size], dtype=np.float32), lengths[start:start+self.chunk_size])
+        return outputs
+
+models = {'forward': Dense, 'sdae': Dense, 'lstm': Lstm}
@@ -0,0 +1,214 @@
+#Scores records with exported models (see runtime.py), without tensorflow
+import numpy as np
+import threading
+import argparse
+import queue
+import json
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import runtime
+import loader
+
+def read_jsonl(path):
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_input(path, format=None): #records are streamed, the file is never loaded at once
+    if format == 'jsonl' or (format is None and path.endswith('.jsonl')):
+        return read_jsonl(path)
+    return loader.read_records(path)
+
+def chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+def get_values(records, waves): #values and classes concatenated as in dataset.Dataset, padded to the same number of waves
+    first = records[0]['waves'][0]
+    attributes_num, classes_num = len(first['values']), len(first['class']['one-hot'])
+    values = np.zeros((len(records), waves, attributes_num + classes_num), dtype=np.float32)
+    for i, record in enumerate(records):
+        for j, wave in enumerate(record['waves'][:waves]):
+            values[i, j, :attributes_num] = wave['values']
+            values[i, j, attributes_num:] = wave['class']['one-hot']
+    return values, classes_num
+
+def last_waves(classes, max_sequence_length): #as dataset.rnn_shift_indexes, the last valid wave is kept since there is no target to predict
+    waves = classes.shape[1]
+    valid = np.max(classes, axis=2) > 0
+    has_valid = np.any(valid, axis=1)
+    end = np.where(has_valid, waves - np.argmax(valid[:, ::-1], axis=1), 0)
+    start = np.where(has_valid, np.argmax(valid, axis=1), 0)
+    start = np.maximum(start, end - max_sequence_length) #the most recent waves
+    return start, end - start
+
+class Scorer:
+
+    def __init__(self, model_path, encoder_path=None):
+        self.model = runtime.load(model_path)
+        self.encoder = runtime.load(encoder_path) if encoder_path is not None else None
+        self.kind = self.model.config['kind']
+
+    def _encode(self, values):
+        if self.encoder is None:
+            return values
+        return self.encoder.timeseries_predict(values)
+
+    def score(self, records):
+        if len(records) == 0:
+            return []
+        waves = max(len(record['waves']) for record in records)
+        values, classes_num = get_values(records, waves)
+        classes = values[:, :, -classes_num:]
+        if self.kind == 'lstm':
+            max_sequence_length = self.model.config['max_sequence_length']
+            start, length = last_waves(classes, max_sequence_length)
+            steps = np.arange(max_sequence_length)
+            indexes = np.minimum(start[:, None] + steps, waves - 1)
+            X = self._encode(values)[np.arange(len(values))[:, None], indexes]
+            X[steps >= length[:, None]] = 0
+            outputs = self.model.predict(X, length)
+            scores = runtime.softmax(outputs[np.arange(len(outputs)), np.maximum(length - 1, 0)]) #class of the next wave
+            return [{'id': record['id'], 'class': int(np.argmax(s)), 'scores': s.tolist()} if l > 0 else {'id': record['id'], 'class': None, 'scores': None}
+                    for record, s, l in zip(records, scores, length)]
+        scores = self.model.timeseries_predict(self._encode(values)) #class of every wave
+        return [{'id': record['id'], 'classes': np.argmax(s[:len(record['waves'])], axis=1).tolist(), 'scores': s[:len(record['waves'])].tolist()}
+                for record, s in zip(records, scores)]
+
+def score_file(scorer, source, destination, format=None, chunk_size=4096):
+    count = 0
+    start = time.perf_counter()
+    with open(destination, 'w') as f:
+        for chunk in chunks(read_input(source, format), chunk_size):
+            f.write(''.join(json.dumps(result) + '\n' for result in scorer.score(chunk)))
+            count += len(chunk)
+            print("Scored {0} records ({1:.0f} records/s)".format(count, count / (time.perf_counter() - start)))
+    return count
+
+class MicroBatcher: #concurrent requests are scored together
+
+    def __init__(self, scorer, max_batch=1024, max_wait=0.005):
+        self.scorer = scorer
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self._loop, daemon=True)
+        self.worker.start()
+
+    def submit(self, records):
+        request = {'records': records, 'done': threading.Event(), 'results': None, 'error': None}
+        self.requests.put(request)
+        request['done'].wait()
+        if request['error'] is not None:
+            raise request['error']
+        return request['results']
+
+    def _collect(self, batch):
+        size = len(batch[0]['records'])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+            size += len(batch[-1]['records'])
+
+    def _score(self, batch):
+        try:
+            results = self.scorer.score([record for request in batch for record in request['records']])
+            for request in batch:
+                request['results'], results = results[:len(request['records'])], results[len(request['records']):]
+        except BaseException:
+            if len(batch) == 1:
+                raise
+            for request in batch: #one malformed request does not fail the others
+                try:
+                    request['results'] = self.scorer.score(request['records'])
+                except BaseException as e:
+                    request['error'] = e
+
+    def _loop(self): #never exits, a request left unanswered would wait forever
+        while True:
+            batch = [self.requests.get()]
+            try:
+                self._collect(batch)
+                self._score(batch)
+            except BaseException as e:
+                for request in batch:
+                    if request['results'] is None and request['error'] is None:
+                        request['error'] = e
+            for request in batch:
+                request['done'].set()
+
+def serve(scorer, host='127.0.0.1', port=8080, max_batch=1024, max_wait=0.005):
+    batcher = MicroBatcher(scorer, max_batch, max_wait)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self): #a record or a list of records
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if not (isinstance(body, dict) or (isinstance(body, list) and all(isinstance(record, dict) for record in body))):
+                    self._reply(400, {'error': "A record or a list of records is expected."})
+                    return
+                single = isinstance(body, dict)
+                results = batcher.submit([body] if single else body)
+                self._reply(200, results[0] if single else results)
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                self._reply(400, {'error': str(e)})
+
+        def _reply(self, status, content):
+            data = json.dumps(content).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 256 #bursts of concurrent clients are expected
+        daemon_threads = True
+
+    server = Server((host, port), Handler)
+    print("Serving on http://{0}:{1}".format(host, port))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score records with an exported model.')
+    parser.add_argument('--model', required=True, help='exported model, e.g. weights/lstm/basic-lstm.npz')
+    parser.add_argument('--encoder', default=None, help='exported sdae applied before the model')
+    commands = parser.add_subparsers(dest='command')
+    score = commands.add_parser('score')
+    score.add_argument('source', help='harmonized.json or .jsonl records')
+    score.add_argument('destination', help='.jsonl predictions')
+    score.add_argument('--format', choices=['json', 'jsonl'], default=None)
+    score.add_argument('--chunk-size', type=int, default=4096)
+    server = commands.add_parser('serve')
+    server.add_argument('--host', default='127.0.0.1')
+    server.add_argument('--port', type=int, default=8080)
+    server.add_argument('--max-batch', type=int, default=1024)
+    server.add_argument('--max-wait-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    scorer = Scorer(args.model, args.encoder)
+    if args.command == 'score':
+        score_file(scorer, args.source, args.destination, args.format, args.chunk_size)
+    elif args.command == 'serve':
+        serve(scorer, args.host, args.port, args.max_batch, args.max_wait_ms / 1000)
+    else:
+        parser.print_help()
@@ -0,0 +1,80 @@
+import numpy as np
+import functools
+import itertools
+import math
+import csv
+import os
+from runner import Stage
+import runner
+
+def grid(space):
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*[space[name] for name in names])]
+
+def sample(space, trials, seed=None): #lists are choices, (low, high) tuples are ranges
+    random = np.random.RandomState(seed)
+    configurations = []
+    for trial in range(trials):
+        configuration = {}
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    configuration[name] = int(random.randint(low, high + 1))
+                else:
+                    configuration[name] = float(random.uniform(low, high))
+            else:
+                configuration[name] = values[random.randint(len(values))]
+        configurations.append(configuration)
+    return configurations
+
+def evaluate(objective, configurations, path='./weights/sweep', workers=None, budget=None, budget_key='epoch', trials=None):
+    if trials is None:
+        trials = list(range(len(configurations)))
+    stages = []
+    for trial, configuration in zip(trials, configurations):
+        parameters = dict(configuration)
+        if budget is not None:
+            parameters[budget_key] = budget
+        weights_path = os.path.join(path, 'trial-{0}'.format(trial)) #trials never share checkpoints
+        os.makedirs(weights_path, exist_ok=True)
+        stages.append(Stage('trial-{0}'.format(trial), functools.partial(objective, parameters, weights_path)))
+    losses = runner.run(stages, workers)
+    return [dict(configuration, trial=trial, budget=budget, loss=float(losses['trial-{0}'.format(trial)])) for trial, configuration in zip(trials, configurations)]
+
+def successive_halving(objective, configurations, min_budget=1, max_budget=27, eta=3, path='./weights/sweep', workers=None, budget_key='epoch'):
+    assert eta > 1, "Eta should be greater than 1"
+    assert min_budget > 0 and max_budget >= min_budget, "Invalid budgets"
+    trials = list(range(len(configurations)))
+    budget = min_budget
+    rows = []
+    while True:
+        print("Evaluating {0} trials with {1} = {2}".format(len(trials), budget_key, budget))
+        results = evaluate(objective, [configurations[t] for t in trials], path, workers, budget, budget_key, trials)
+        rows += results
+        if len(trials) == 1 or budget * eta > max_budget:
+            return rows
+        results.sort(key=lambda row: row['loss'] if not math.isnan(row['loss']) else np.inf) #diverged trials are dropped first
+        trials = [row['trial'] for row in results[:max(1, len(results) // eta)]] #only the best fraction gets the larger budget
+        budget *= eta
+
+def best(rows):
+    return min(rows, key=lambda row: (-(row['budget'] or 0), row['loss'] if not math.isnan(row['loss']) else np.inf))
+
+def print_table(rows):
+    columns = sorted(set(key for row in rows for key in row) - {'trial', 'budget', 'loss'})
+    columns = ['trial', 'budget'] + columns + ['loss']
+    table = [[str(row.get(column, '')) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(line[i]) for line in table]) for i, column in enumerate(columns)]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for line in table:
+        print('  '.join(value.ljust(width) for value, width in zip(line, widths)))
+
+def save_table(rows, path):
+    columns = sorted(set(key for row in rows for key in row))
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
@@ -0,0 +1,15 @@
+import sys
+import os
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root) #the modules live at the top of the repository
+
+class Repository: #collected as a plain folder, importing its __init__.py would import tensorflow
+
+    def pytest_collect_directory(self, path, parent):
+        if str(path) == root:
+            return pytest.Dir.from_parent(parent, path=path)
+
+def pytest_configure(config): #a plugin, the hooks of this conftest apply only below tests/
+    config.pluginmanager.register(Repository())
@@ -0,0 +1,27 @@
+import shutil
+import numpy as np
+import cache
+
+def compile_function(source): #functions of the same name whose body changes between runs
+    namespace = {'np': np}
+    exec(source, namespace)
+    return namespace['scale']
+
+def test_key_changes_with_constants_and_globals(tmp_path):
+    store = cache.Cache(str(tmp_path))
+    sources = ["def scale(x):\n    return x * 2\n", "def scale(x):\n    return x * 3\n",
+               "def scale(x):\n    return np.sqrt(x)\n", "def scale(x):\n    return np.exp(x)\n",
+               "def scale(x):\n    return np.array([v * 2 for v in x])\n", "def scale(x):\n    return np.array([v * 4 for v in x])\n"]
+    keys = {store.key(compile_function(source), (np.ones(3),), {}) for source in sources}
+    assert len(keys) == len(sources)
+    assert np.all(store.get_or_compute(compile_function(sources[1]), np.ones(3)) == 3)
+
+def test_evict_skips_entries_removed_meanwhile(tmp_path):
+    store = cache.Cache(str(tmp_path), max_size=1)
+    store.get_or_compute(compile_function("def scale(x):\n    return x * 2\n"), np.ones(3))
+    size = store.size
+    def removed(entry): #another process evicts the entry while it is measured
+        shutil.rmtree(entry, ignore_errors=True)
+        return size(entry)
+    store.size = removed
+    store._evict()
@@ -0,0 +1,18 @@
+import sys
+import numpy as np
+import runtime
+import cli
+
+def test_evaluate_lstm_without_tensorflow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'tensorflow', None) #any import of tensorflow fails
+    monkeypatch.delitem(sys.modules, 'utils', raising=False)
+    random = np.random.RandomState(0)
+    classes = np.eye(3, dtype=np.float32)[random.randint(3, size=(20, 6))]
+    classes[random.rand(20, 6) < 0.3] = 0 #missing waves
+    np.save(str(tmp_path / 'e_records.npy'), random.rand(20, 6, 4).astype(np.float32))
+    np.save(str(tmp_path / 'e_classes.npy'), classes)
+    runtime.save(str(tmp_path / 'lstm.npz'), 'lstm', {'activation_function': 'tanh', 'forget_bias': 1.0, 'max_sequence_length': 3},
+                 {'kernel': random.randn(7 + 3, 4 * 5), 'bias': random.randn(4 * 5), 'projection': random.randn(5, 3)})
+    metrics = cli.main(['evaluate', '--model', str(tmp_path / 'lstm.npz'), '--data-path', str(tmp_path), '--prefix', 'e'])
+    assert 0 <= metrics['accuracy'] <= 1
+    assert 'utils' not in sys.modules
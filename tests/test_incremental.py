@@ -0,0 +1,59 @@
+import numpy as np
+import runtime
+import scoring
+import incremental
+
+def save_lstm(path, attributes_num=4, classes_num=3, state_size=6, max_sequence_length=5):
+    random = np.random.RandomState(0)
+    input_size = attributes_num + classes_num
+    runtime.save(path, 'lstm', {'activation_function': 'tanh', 'forget_bias': 1.0, 'max_sequence_length': max_sequence_length},
+                 {'kernel': random.randn(input_size + classes_num, 4 * state_size) * 0.5, 'bias': random.randn(4 * state_size) * 0.1,
+                  'projection': random.randn(state_size, classes_num)})
+
+def wave(random, classes_num=3, valid=True):
+    one_hot = np.eye(classes_num)[random.randint(classes_num)] if valid else np.zeros(classes_num)
+    return {'values': random.rand(4).tolist(), 'class': {'one-hot': one_hot.tolist()}}
+
+def test_update_matches_batch_scoring(tmp_path):
+    save_lstm(str(tmp_path / 'lstm.npz'))
+    random = np.random.RandomState(1)
+    people = [[wave(random, valid=j > i % 3) for j in range(8)] for i in range(6)] #leading waves without a class, histories longer than the window
+    batch = scoring.Scorer(str(tmp_path / 'lstm.npz'))
+    stateful = incremental.IncrementalScorer(str(tmp_path / 'lstm.npz'), state_path=str(tmp_path / 'states.sqlite'), capacity=2)
+    for length in range(1, 9):
+        records = [{'id': str(i), 'waves': waves[:length]} for i, waves in enumerate(people)]
+        expected = batch.score(records)
+        results = stateful.score([{'id': str(i), 'waves': waves[length - 1:length]} for i, waves in enumerate(people)])
+        for result, reference in zip(results, expected):
+            if reference['scores'] is None:
+                assert result['scores'] is None
+            else:
+                assert result['class'] == reference['class']
+                assert np.allclose(result['scores'], reference['scores'], atol=1e-5)
+    stateful.close()
+
+def test_several_waves_of_a_person_in_one_batch(tmp_path):
+    random = np.random.RandomState(2)
+    model_path = str(tmp_path / 'lstm.npz')
+    save_lstm(model_path)
+    waves = [wave(random) for j in range(7)]
+    expected = scoring.Scorer(model_path).score([{'id': 'a', 'waves': waves}])[0]
+    result = incremental.IncrementalScorer(model_path).score([{'id': 'a', 'waves': waves}])[0]
+    assert np.allclose(result['scores'], expected['scores'], atol=1e-5)
+    assert result['waves'] == 7
+
+def test_missing_waves_after_a_class(tmp_path):
+    model_path = str(tmp_path / 'lstm.npz')
+    save_lstm(model_path)
+    random = np.random.RandomState(3)
+    people = [[wave(random, valid=random.rand() < 0.5) for j in range(10)] for i in range(40)] #histories ending in waves without a class
+    batch = scoring.Scorer(model_path)
+    stateful = incremental.IncrementalScorer(model_path, state_path=str(tmp_path / 'states.sqlite'), capacity=8)
+    for length in range(1, 11):
+        expected = batch.score([{'id': str(i), 'waves': waves[:length]} for i, waves in enumerate(people)])
+        results = stateful.score([{'id': str(i), 'waves': waves[length - 1:length]} for i, waves in enumerate(people)])
+        for result, reference in zip(results, expected):
+            assert result['class'] == reference['class']
+            if reference['scores'] is not None:
+                assert np.allclose(result['scores'], reference['scores'], atol=1e-5)
+    stateful.close()
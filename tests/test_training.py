@@ -0,0 +1,28 @@
+import numpy as np
+import json
+import checkpoint
+from training import TrainingController
+
+class Session: #the values of the variables, as a tensorflow session would fetch them
+
+    def __init__(self, values):
+        self.values = values
+
+    def run(self, fetches):
+        return self.values
+
+def test_checkpoint_after_update(tmp_path):
+    controller = TrainingController(0.1, 'plateau', patience=3, plateau_patience=1)
+    controller.update(np.float32(0.5)) #losses come from sess.run
+    controller.update(np.float32(0.7))
+    checkpointer = checkpoint.Checkpointer(str(tmp_path), ['weights'], every_steps=1)
+    checkpointer.step(Session([np.ones(3, dtype=np.float32)]), lambda: {'epoch': 1, 'position': 2, 'random_state': checkpoint.get_random_state(), 'controller': controller.__dict__})
+    checkpointer.close()
+    assert len(checkpointer.checkpoints()) == 1
+
+    resumed = TrainingController(0.1, 'plateau', patience=3, plateau_patience=1)
+    with open(checkpointer.checkpoints()[-1] + '.json', 'r') as f:
+        state = json.load(f)
+    assert checkpoint.resume(state, resumed) == (1, 2)
+    assert resumed.__dict__ == controller.__dict__
+    assert resumed.best_loss == np.float32(0.5) and resumed.scale == 0.5 and resumed.improved is False
@@ -0,0 +1,45 @@
+import numpy as np
+import math
+
+def get_learning_rate(name, learning_rate, step):
+    if name == 'none' or name == 'plateau': #plateau reductions are applied by TrainingController
+        return learning_rate
+    elif name == 'fraction':
+        return learning_rate / (1 + step)
+    elif name == 'exponential':
+        return learning_rate * math.pow(0.99, float(step))
+    raise BaseException("Invalid learning rate.")
+
+class TrainingController: #its attributes are saved in the periodic checkpoints, so they hold python values only
+
+    def __init__(self, learning_rate, learning_rate_decay='none', patience=0, plateau_patience=2, plateau_factor=0.5, min_delta=0.):
+        assert patience >= 0, "Patience should not be negative"
+        assert plateau_factor > 0 and plateau_factor <= 1, "Invalid plateau factor."
+        self.learning_rate = learning_rate
+        self.learning_rate_decay = learning_rate_decay
+        self.patience = patience
+        self.plateau_patience = plateau_patience
+        self.plateau_factor = plateau_factor
+        self.min_delta = min_delta
+        self.scale = 1.
+        self.best_loss = np.inf
+        self.bad_epochs = 0
+        self.plateau_epochs = 0
+        self.improved = False
+
+    def get_learning_rate(self, epoch):
+        return get_learning_rate(self.learning_rate_decay, self.learning_rate, epoch) * self.scale
+
+    def update(self, loss): #returns True when training should stop
+        self.improved = bool(loss < self.best_loss - self.min_delta) #losses fetched from a session are numpy scalars
+        if self.improved:
+            self.best_loss = float(loss)
+            self.bad_epochs = 0
+            self.plateau_epochs = 0
+            return False
+        self.bad_epochs += 1
+        self.plateau_epochs += 1
+        if self.learning_rate_decay == 'plateau' and self.plateau_epochs >= self.plateau_patience:
+            self.scale *= self.plateau_factor
+            self.plateau_epochs = 0
+        return self.patience > 0 and self.bad_epochs >= self.patience
@@ -1,8 +1,9 @@
 import numpy as np
 import tensorflow as tf
-import math
+import dataset
 
 class Utils:
+    session_config = None
 
     def get_activation(name):
         if name == 'sigmoid':
@@ -54,34 +55,46 @@ class Utils:
             return tf.train.AdamOptimizer(learning_rate=learning_rate)
         raise BaseException("Invalid optimizer.")
 
-    def get_learning_rate(name, learning_rate, step):
-        if name == 'none':
-            return learning_rate
-        elif name == 'fraction':
-            return learning_rate / (1 + step)
-        elif name == 'exponential':
-            return learning_rate * math.pow(0.99, float(step))
-        raise BaseException("Invalid learning rate.")
-
-    def homogenize(X, Y, ratio_threshold=1): #TODO: add also class0 records?
+    def set_session_threads(intra_op_threads=0, inter_op_threads=0): #0 lets tensorflow use every core
+        Utils.session_config = tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads, inter_op_parallelism_threads=inter_op_threads)
+
+    def get_session(graph=None):
+        return tf.Session(graph=graph, config=Utils.session_config)
+
+    def get_running_means(values, name, dependencies=[]): #the updates run after the dependencies, e.g. the optimizer step
+        means, updates, variables = [], [], []
+        with tf.variable_scope(name):
+            for i in range(len(values)):
+                total = tf.Variable(0., trainable=False, collections=[tf.GraphKeys.LOCAL_VARIABLES], name='total_{0}'.format(i))
+                count = tf.Variable(0., trainable=False, collections=[tf.GraphKeys.LOCAL_VARIABLES], name='count_{0}'.format(i))
+                means.append(total / tf.maximum(count, 1.))
+                variables += [total, count]
+            with tf.control_dependencies(dependencies):
+                for i in range(len(values)):
+                    updates.append(tf.assign_add(variables[2 * i], tf.cast(values[i], tf.float32)))
+                    updates.append(tf.assign_add(variables[2 * i + 1], 1.))
+        return means, tf.group(*updates), tf.variables_initializer(variables)
+
+    def homogenize_indexes(Y, ratio_threshold=1, random=np.random): #TODO: add also class0 records?
         assert ratio_threshold > 0 and ratio_threshold <= 1, "Invalid ratio threshold."
+        Y = np.asarray(Y)
         class_num = len(Y[0])
         class_occurrences = np.int32(np.sum(Y, 0))
         class_max_occurrence = np.int32(np.max(class_occurrences) * ratio_threshold)
-        class_indexes = [np.where((np.argmax(Y,1) == i) & (np.sum(Y,1) > 0)) for i in range(class_num)]
+        class_indexes = [np.where((np.argmax(Y,1) == i) & (np.sum(Y,1) > 0))[0] for i in range(class_num)]
 
-        newX = []
-        newY = []
+        indexes = []
         for i in range(len(class_indexes)):
             if(class_occurrences[i] >= class_max_occurrence):
-                idx = range(class_occurrences[i])
+                idx = np.arange(class_occurrences[i])
             else:
-                idx = np.random.choice(len(class_indexes[i][0]), class_max_occurrence)
-            for j in idx:
-                newX.append(X[class_indexes[i][0][j]])
-                newY.append(Y[class_indexes[i][0][j]])
+                idx = random.choice(len(class_indexes[i]), class_max_occurrence)
+            indexes.append(class_indexes[i][idx])
+        return np.concatenate(indexes)
 
-        return np.array(newX, dtype=np.float32), np.array(newY, dtype=np.float32)
+    def homogenize(X, Y, ratio_threshold=1):
+        indexes = Utils.homogenize_indexes(Y, ratio_threshold)
+        return np.asarray(X[indexes], dtype=np.float32), np.asarray(Y[indexes], dtype=np.float32)
 
     def get_batch(X, X_, size): 
         assert size > 0, "Size should positive"
@@ -103,17 +116,67 @@ class Utils:
         assert start >= 0, "Start should not be negative"   
         return X[start:start+size], X_[start:start+size], lengths[start:start+size]
     
+    def get_rnn_bucketed_batches(lengths, size):
+        assert size > 0, "Size should positive"
+        order = np.lexsort((np.random.rand(len(lengths)), lengths)) #similar lengths end up in the same batch, ties are shuffled
+        batches = [order[start:start+size] for start in range(0, len(order), size)]
+        np.random.shuffle(batches)
+        return batches
+
+    def get_rnn_indexed_batch(X, X_, lengths, idx):
+        max_length = max(1, np.max(lengths[idx])) #drop the timesteps that are padding for the whole batch
+        return X[idx, :max_length], X_[idx, :max_length], lengths[idx]
+
     def generate_sdae_train_test(X, training_fraction):
         indexes = np.random.rand(X.shape[0]) < training_fraction
-        return X[indexes], X[~indexes]
+        return dataset.take(X, indexes), dataset.take(X, ~indexes)
 
     def generate_classifier_train_test(X, Y, training_fraction):
         indexes = np.random.rand(X.shape[0]) < training_fraction
-        return [X[indexes], Y[indexes]], [X[~indexes], Y[~indexes]]
+        return [dataset.take(X, indexes), dataset.take(Y, indexes)], [dataset.take(X, ~indexes), dataset.take(Y, ~indexes)]
 
     def generate_rnn_train_test(X, Y, lengths, training_fraction):
         indexes = np.random.rand(X.shape[0]) < training_fraction
-        return [X[indexes], Y[indexes], lengths[indexes]], [X[~indexes], Y[~indexes], lengths[~indexes]]
+        return [dataset.take(X, indexes), dataset.take(Y, indexes), lengths[indexes]], [dataset.take(X, ~indexes), dataset.take(Y, ~indexes), lengths[~indexes]]
+
+    def get_folds(length, k):
+        assert k > 1, "At least two folds are needed"
+        return [np.sort(fold) for fold in np.array_split(np.random.permutation(length), k)]
+
+    def get_stratified_folds(labels, k):
+        assert k > 1, "At least two folds are needed"
+        folds = [[] for i in range(k)]
+        offset = 0
+        for label in np.unique(labels):
+            members = np.random.permutation(np.where(labels == label)[0])
+            for i, part in enumerate(np.array_split(members, k)):
+                folds[(i + offset) % k].append(part)
+            offset += len(members) % k #the larger parts go to the smaller folds
+        return [np.sort(np.concatenate(fold)) for fold in folds]
+
+    def get_fold_labels(Y, lengths=None): #class of the last wave of each sequence
+        labels = np.empty(len(Y), dtype=np.int64)
+        for start in range(0, len(Y), 65536):
+            chunk = np.asarray(Y[start:start+65536])
+            if lengths is not None:
+                chunk = chunk[np.arange(len(chunk)), np.maximum(lengths[start:start+len(chunk)] - 1, 0)]
+            labels[start:start+len(chunk)] = np.argmax(chunk, axis=-1)
+        return labels
+
+    def get_train_test_folds(folds):
+        return [(np.sort(np.concatenate(folds[:i] + folds[i+1:])), fold) for i, fold in enumerate(folds)]
+
+    def generate_sdae_folds(X, k):
+        return [(dataset.take(X, train), dataset.take(X, test)) for train, test in Utils.get_train_test_folds(Utils.get_folds(len(X), k))]
+
+    def generate_classifier_folds(X, Y, k, stratified=False):
+        folds = Utils.get_stratified_folds(Utils.get_fold_labels(Y), k) if stratified else Utils.get_folds(len(X), k)
+        return [([dataset.take(X, train), dataset.take(Y, train)], [dataset.take(X, test), dataset.take(Y, test)]) for train, test in Utils.get_train_test_folds(folds)]
+
+    def generate_rnn_folds(X, Y, lengths, k, stratified=False):
+        folds = Utils.get_stratified_folds(Utils.get_fold_labels(Y, lengths), k) if stratified else Utils.get_folds(len(X), k)
+        return [([dataset.take(X, train), dataset.take(Y, train), lengths[train]], [dataset.take(X, test), dataset.take(Y, test), lengths[test]])
+                for train, test in Utils.get_train_test_folds(folds)]
 
     def get_cost_mask(Y):
         axes = tuple(range(len(Y.shape) - 1))
@@ -121,61 +184,50 @@ class Utils:
         class_max_occurrence = np.int32(np.max(class_occurrences))
         return np.array(class_max_occurrence / class_occurrences)
 
-    def rnn_shift_padding(X, X_, max_sequence_length): #TODO fix truncate case
-        assert len(X) > 0, "Dataset should have at least one timeseries"
+    def rnn_shift_padding(X, X_, max_sequence_length):
         assert len(X) == len(X_), "Input and classes should have the same length"
-        assert max_sequence_length > 0, "Max sequence length should be positive" 
-        dim = len(X)
-        input_size = len(X[0][0])
-        class_size = len(X_[0][0])
-        newX = []
-        newX_ = []
-        sequence_length = []
-
-        for index in range(len(X_)):
-            start = 0
-            end = 0
-
-            if(np.max(X_[index]) > 0): #at least 1 valid class
-                start = np.where(np.array([np.max(wave) for wave in X_[index]]) > 0)[0][0]
-                end = np.where(np.array([np.max(wave) for wave in X_[index]]) > 0)[0][-1:][0]
-            if(end > max_sequence_length):
-                end = max_sequence_length
-            length = end - start
-
-            shifted_classes = np.concatenate((X_[index][1:], [np.zeros(class_size)]))
-            waves_indexes = np.arange(start, end)
-            if(length < max_sequence_length):
-                tmpX = np.concatenate((X[index][waves_indexes], [np.zeros(input_size) for i in range(length, max_sequence_length)]))
-                tmpX_ = np.concatenate((shifted_classes[waves_indexes], [np.zeros(class_size) for i in range(length, max_sequence_length)]))
-            else:
-                tmpX = np.array(X[index][waves_indexes])
-                tmpX_ = np.array(shifted_classes[waves_indexes])
-            
-            if length > 0:
-                newX.append(tmpX)
-                newX_.append(tmpX_)
-                sequence_length.append(length)
-        return np.array(newX), np.array(newX_), np.array(sequence_length)
+        selection, start, length = dataset.rnn_shift_indexes(X_, max_sequence_length)
+        newX = dataset.rnn_shift_gather(X, selection, start, length, max_sequence_length)
+        newX_ = dataset.rnn_shift_gather(X_, selection, start, length, max_sequence_length, shift=1) #classes shifted by one wave
+        return newX, newX_, length
     
-    def add_noise(x, noise):
-        shape = x.shape
-        x = np.reshape(x, (-1, shape[-1]))
-        result = []
+    def add_noise(x, noise, out=None):
+        if out is None:
+            out = np.empty(x.shape, dtype=x.dtype)
+        assert out.shape == x.shape, "Output buffer should have the same shape as the input"
+        assert out.flags['C_CONTIGUOUS'], "Output buffer should be contiguous"
+        if out is not x:
+            out[...] = x
+        if noise == 'gaussian':
+            out += np.random.normal(0, 0.1, x.shape)
+        elif 'mask' in noise:
+            frac = float(noise.split('-')[1])
+            rows = np.reshape(out, (-1, x.shape[-1]))
+            masked = int(round(frac * x.shape[-1]))
+            if masked >= x.shape[-1]:
+                rows[...] = 0
+            elif masked > 0: #the lowest random keys of each row pick distinct features to drop
+                idx = np.argpartition(np.random.rand(len(rows), x.shape[-1]), masked, axis=1)[:, :masked]
+                np.put_along_axis(rows, idx, 0, axis=1)
+        return out
+
+    def get_noise(x, noise): #add_noise as graph ops, the corruption changes at every run
         if noise == 'none':
-            result = x
+            return x
         elif noise == 'gaussian':
-            n = np.random.normal(0, 0.1, (len(x), len(x[0])))
-            result = x + n
+            return x + tf.random_normal(tf.shape(x), 0, 0.1)
         elif 'mask' in noise:
             frac = float(noise.split('-')[1])
-            temp = np.copy(x)
-            for i in temp:
-                n = np.random.choice(len(i), int(round(frac * len(i))), replace=False)
-                i[n] = 0
-            result = temp   
-        result = np.reshape(result, shape)
-        return result
+            features = int(x.shape[-1])
+            masked = int(round(frac * features))
+            if masked >= features:
+                return tf.zeros_like(x)
+            elif masked == 0:
+                return x
+            keys = tf.random_uniform(tf.shape(x))
+            threshold = tf.nn.top_k(-keys, k=masked).values[:, -1:] #the lowest random keys of each row pick the features to drop
+            return x * tf.cast(-keys < threshold, x.dtype)
+        raise BaseException("Invalid noise.")
 
     def noise_validator(noises):
         if not isinstance(noises, list):